@@ -1,14 +1,75 @@
 # coding=utf-8
 
 import app as finn
+import hashlib
+import numpy as np
 import os
 import xml.etree.ElementTree as ET
 
 from collections import Counter, namedtuple
+from multiprocessing import Pool
+from sqlalchemy import exists, func
+from sqlalchemy.orm import aliased
 
 # word forms: 991730 (exluding unseen lemmas)
 # xml files: 61,529
 
+AAMULEHTI = 'aamulehti-1999'
+
+# the number of rows per executemany INSERT
+BATCH_SIZE = 5000
+
+
+def walk_aamulehti():
+    '''Yield the filename and filepath of each document in the corpus.'''
+    for dirpath, dirname, filenames in os.walk(AAMULEHTI):
+
+        if dirpath == AAMULEHTI:
+            continue
+
+        # only the first file in each directory is read, as before
+        for f in filenames[:1]:
+            yield f, dirpath + '/' + f
+
+
+def iter_words(filepath):
+    '''Stream (text, lemma, msd, pos) for each word element in filepath.
+
+    Elements are cleared as soon as they have been read, so that memory use
+    stays flat regardless of the size of the file.
+    '''
+    for event, elem in ET.iterparse(filepath, events=('end', )):
+
+        if elem.tag == 'w':
+            yield (
+                elem.text or '',
+                elem.attrib['lemma'],
+                elem.attrib['msd'],
+                elem.attrib['type'],
+                )
+
+        elem.clear()
+
+
+def insert_rows(model, rows):
+    '''Insert rows (a list of column-value dicts) in one executemany INSERT.'''
+    if rows:
+        finn.db.session.execute(model.__table__.insert(), rows)
+
+
+def insert_batches(model, rows):
+    '''Insert the iterable rows in executemany INSERTs of BATCH_SIZE rows.'''
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+
+        if len(batch) == BATCH_SIZE:
+            insert_rows(model, batch)
+            batch = []
+
+    insert_rows(model, batch)
+
 
 # Tokens ----------------------------------------------------------------------
 
@@ -16,45 +77,38 @@ characters = u'aAbBcCDdeEfFGgHhiIjJkKLlMmnNoOpPqQRrSsTtUuVvWwxXyYzZ -äöÄÖ'
 invalid_types = ['Delimiter', 'Abbrev', 'Code']
 
 Token = namedtuple('Token', ['orth', 'lemma', 'msd', 'pos'])
-TOKENS = []
-
 
-def populate_db_tokens_from_aamulehti_1999():
-    for tup in os.walk('aamulehti-1999'):
-        dirpath, dirname, filenames = tup
 
-        if dirpath == 'aamulehti-1999':
-            continue
-
-        for f in filenames:
-            filepath = dirpath + '/' + f
-            accumulate_tokens(f, filepath)
+def populate_db_tokens_from_aamulehti_1999(workers=16):
+    # count each file's tokens in parallel, merging the counts as they arrive
+    pool = Pool(workers, initializer=finn.init_worker)
+    files = (fp for f, fp in walk_aamulehti())
+    freqs = Counter()
 
-            break
+    for i, counts in enumerate(
+            pool.imap_unordered(count_tokens, files, chunksize=50),
+            start=1,
+            ):
+        freqs.update(counts)
 
-        print dirpath
+        if i % 1000 == 0:
+            print '%s files' % i
 
-    global TOKENS
-    FREQS = Counter(TOKENS)
-    TOKENS = None  # save memory
-    tokens = distill_tokens(FREQS)
-    FREQS = None  # save memory
+    tokens = distill_tokens(freqs)
 
-    save_tokens(tokens)
+    save_tokens(tokens, pool)
+    pool.close()
+    pool.join()
 
     print '%s tokens' % len(tokens)
 
 
-def accumulate_tokens(filename, filepath):
-    tree = ET.parse(filepath)
-    root = tree.getroot()
+def count_tokens(filepath):
+    '''Return a Counter of the tokens that appear in filepath.'''
+    tokens = Counter()
 
     try:
-        for w in root.iter('w'):
-            lemma = w.attrib['lemma']
-            msd = w.attrib['msd']
-            pos = w.attrib['type']
-            t = w.text or ''
+        for t, lemma, msd, pos in iter_words(filepath):
 
             if t != t.upper():
 
@@ -64,10 +118,12 @@ def accumulate_tokens(filename, filepath):
                     lemma = lemma.lower() if pos != 'Proper' else lemma
 
                     tok = Token(orth, lemma, msd, pos)
-                    TOKENS.append(tok)
+                    tokens[tok] += 1
 
     except Exception as E:
-        print filename, E
+        print filepath, E
+
+    return tokens
 
 
 def distill_tokens(freqs):
@@ -83,71 +139,204 @@ def distill_tokens(freqs):
     return freqs
 
 
-def save_tokens(tokens):
-    for token, freq in tokens.iteritems():
-        t = finn.Token(
-            orth=token.orth,
-            lemma=token.lemma,
-            msd=token.msd,
-            pos=token.pos,
-            freq=freq,
-            is_aamulehti=True,
-            )
-        finn.db.session.add(t)
-
+def save_tokens(tokens, pool):
+    # split and syllabify the tokens in the worker pool and insert them in
+    # batches, bypassing the ORM
+    rows = pool.imap(_token_row, tokens.iteritems(), chunksize=500)
+    insert_batches(finn.Token, rows)
     finn.db.session.commit()
 
 
+def _token_row(item):
+    # (Token, freq) -> Token column values
+    token, freq = item
+    row = dict(
+        orth=token.orth,
+        lemma=token.lemma,
+        msd=token.msd,
+        pos=token.pos,
+        freq=freq,
+        is_aamulehti=True,
+        )
+    row.update(finn.split_values(token.orth))
+    row.update(finn.syllabify_values(token.orth))
+
+    return row
+
+
 # Documents -------------------------------------------------------------------
 
+# (orth, lemma, msd, pos) -> Token.id, or a TokenLookup
 INDICES = {}
 
 
-def populate_db_docs_from_aamulehti_1999():
-    collect_token_ids()
+def populate_db_docs_from_aamulehti_1999(workers=16, lookup=None):
+    '''Tokenize and insert the Documents of the corpus.
+
+    If lookup is a filename, the token ids are written to a lookup file and
+    memory-mapped, rather than held in a dict.
+    '''
+    global INDICES
 
-    for tup in os.walk('aamulehti-1999'):
-        dirpath, dirname, filenames = tup
+    if lookup:
+        write_token_lookup(lookup)
+        INDICES = TokenLookup(lookup)
 
-        if dirpath == 'aamulehti-1999':
-            continue
+    else:
+        INDICES = collect_token_ids()
 
-        for f in filenames:
-            filepath = dirpath + '/' + f
-            accumulate_docs(f, filepath)
+    # the workers are forked after INDICES is populated, so that each shares
+    # the parent's copy rather than rebuilding its own
+    pool = Pool(workers)
+    files = walk_aamulehti()
+    rows = []
 
-            break
+    for i, row in enumerate(
+            pool.imap(tokenize_doc, files, chunksize=50),
+            start=1,
+            ):
 
-        print dirpath
+        if i % 1000 == 0:
+            print '%s files' % i
+
+        if row is not None:
+            rows.append(row)
+
+        if len(rows) == BATCH_SIZE:
+            save_docs(rows)
+            rows = []
+
+    save_docs(rows)
+    pool.close()
 
-    global INDICES
     INDICES = None  # save memory
 
-    finn.syllabify_tokens()
+    finn.syllabify_tokens(workers=workers)
     finn.db.session.commit()
 
 
+def iter_token_keys():
+    '''Stream ((orth, lemma, msd, pos), id) for each Token, in id order.
+
+    Only these five columns are selected, and the rows are streamed from a
+    server-side cursor rather than loaded at once.
+    '''
+    query = finn.db.session.query(
+        finn.Token.orth,
+        finn.Token.lemma,
+        finn.Token.msd,
+        finn.Token.pos,
+        finn.Token.id,
+        ) \
+        .order_by(finn.Token.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(10000)
+
+    for orth, lemma, msd, pos, tok_id in query:
+        yield (orth, lemma, msd, pos), tok_id
+
+
 def collect_token_ids():
-    query = finn.Token.query.all()
+    '''Return a dict of (orth, lemma, msd, pos) -> Token.id.'''
+    indices = {}
 
-    for t in query:
-        tok, tok_id = (t.orth, t.lemma, t.msd, t.pos), t.id
-        INDICES[tok] = tok_id
+    # lemmas, msds, and poses repeat across many tokens, so each distinct
+    # string is kept once (intern() doesn't take unicode)
+    strings = {}
+    intern = lambda s: strings.setdefault(s, s)
 
+    for (orth, lemma, msd, pos), tok_id in iter_token_keys():
+        tok = (orth, intern(lemma), intern(msd), intern(pos))
 
-def accumulate_docs(filename, filepath):
-    tree = ET.parse(filepath)
-    root = tree.getroot()
+        # duplicate keys resolve to the earliest Token
+        indices.setdefault(tok, tok_id)
+
+    return indices
+
+
+# Token lookup files ----------------------------------------------------------
+
+# A token lookup file is a .npy array of (hash, id) records, sorted by hash,
+# where hash is the first eight bytes of the md5 digest of the token's key.
+# It holds no strings, and is memory-mapped, so that forked workers share its
+# pages rather than each touching (and copying) a dict of a million tuples.
+
+LOOKUP_DTYPE = np.dtype([('hash', '<u8'), ('id', '<i4')])
+
+
+def key_hash(tok):
+    '''Return the 64-bit hash of the token key (orth, lemma, msd, pos).'''
+    key = u'\x00'.join(s or u'' for s in tok).encode('utf-8')
+
+    return np.frombuffer(hashlib.md5(key).digest(), '<u8', 1)[0]
+
+
+def write_token_lookup(filename):
+    '''Write the (orth, lemma, msd, pos) -> Token.id lookup to filename.'''
+    records = np.fromiter(
+        ((key_hash(tok), tok_id) for tok, tok_id in iter_token_keys()),
+        dtype=LOOKUP_DTYPE,
+        )
+
+    # a stable sort keeps duplicate keys in id order, so that they resolve
+    # to the earliest Token, as in collect_token_ids()
+    records = records[np.argsort(records['hash'], kind='mergesort')]
+
+    # (np.save() would append .npy to a filename given as a string)
+    with open(filename, 'wb') as f:
+        np.save(f, records)
+
+    print '%s token ids written to %s' % (len(records), filename)
+
+
+class TokenLookup(object):
+    '''A read-only, memory-mapped token lookup file.'''
+
+    def __init__(self, filename):
+        self.records = np.load(filename, mmap_mode='r')
+        self.hashes = self.records['hash']
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, tok, default=None):
+        h = key_hash(tok)
+        i = self.hashes.searchsorted(h)
+
+        if i < len(self.hashes) and self.hashes[i] == h:
+            return int(self.records['id'][i])
+
+        return default
+
+
+def save_docs(rows):
+    '''Insert the Documents in rows and the positions of their texts.'''
+    texts = {row['filename']: row.pop('tokenized_text') for row in rows}
+    insert_rows(finn.Document, rows)
+
+    # look up the IDs of the freshly inserted Documents
+    ids = finn.db.session.query(finn.Document.filename, finn.Document.id) \
+        .filter(finn.Document.filename.in_(texts.keys()))
+    positions = []
+
+    for filename, doc_id in ids:
+        for row in finn.text_positions(texts[filename]):
+            row['document_id'] = doc_id
+            positions.append(row)
+
+    insert_rows(finn.DocumentToken, positions)
+    finn.count_unverified(ids.with_entities(finn.Document.id))
+
+
+def tokenize_doc(args):
+    '''Return the Document column values for the file (filename, filepath).'''
+    filename, filepath = args
 
     tokens = set()
     tokenized_text = []
 
     try:
-        for w in root.iter('w'):
-            t = w.text or ''
-            lemma = w.attrib['lemma']
-            msd = w.attrib['msd']
-            pos = w.attrib['type']
+        for t, lemma, msd, pos in iter_words(filepath):
 
             # convert words that are not proper nouns into lowercase
             orth = t.lower() if pos != 'Proper' else t
@@ -166,9 +355,11 @@ def accumulate_docs(filename, filepath):
             else:
                 tokenized_text.append(t)
 
-        # create document instance
-        doc = finn.Document(filename, tokenized_text, list(tokens))
-        finn.db.session.add(doc)
+        return dict(
+            filename=filename,
+            tokenized_text=tokenized_text,
+            unique_count=len(tokens),
+            )
 
     except Exception as E:
         print filename, E
@@ -178,23 +369,51 @@ def accumulate_docs(filename, filepath):
 
 # arrange in order of allomorph frequency?
 
-def syllabify_unseen_lemmas():
-    # get all unique lemmas
-    lemmas = finn.db.session.query(finn.Token.lemma, finn.Token.pos).distinct()
-
-    # isolate lemmas that do not have their own Tokens
-    unseen = [t for t in lemmas if not finn.find_token(t[0].replace('_', ' '))]
+def syllabify_unseen_lemmas(workers=16):
+    '''Create a Token for each lemma that does not have its own Token.'''
+    unseen = get_unseen_lemmas()
 
     print '%s unseen lemmas' % len(unseen)
-    import pdb
-    pdb.set_trace()
-
-    # create Tokens for unseen lemmas
-    for t in unseen:
-        word = finn.Token(t[0].replace('_', ' '), t[0], '', t[1], 0)
-        word.syllabify()
-        finn.db.session.add(word)
-        finn.db.session.commit()
+
+    # split and syllabify the lemmas in the worker pool and insert them in
+    # batches, bypassing the ORM
+    pool = Pool(workers, initializer=finn.init_worker)
+    rows = pool.imap(_lemma_row, unseen, chunksize=500)
+    insert_batches(finn.Token, rows)
+    pool.close()
+    pool.join()
+
+    finn.db.session.commit()
+
+
+def get_unseen_lemmas():
+    '''Return the distinct (lemma, pos) pairs whose lemmas lack Tokens.
+
+    A lemma is seen if some Token's orth matches it case-insensitively, with
+    its underscores read as spaces (as find_token() did). The anti-join uses
+    the index on lower(orth).
+    '''
+    other = aliased(finn.Token)
+    readable = func.lower(func.replace(finn.Token.lemma, '_', ' '))
+    seen = exists().where(func.lower(other.orth) == readable)
+
+    query = finn.db.session.query(finn.Token.lemma, finn.Token.pos) \
+        .filter(finn.Token.lemma != None, finn.Token.lemma != '') \
+        .filter(~seen) \
+        .distinct()
+
+    return query.all()
+
+
+def _lemma_row(lemma_pos):
+    # (lemma, pos) -> Token column values
+    lemma, pos = lemma_pos
+    orth = lemma.replace('_', ' ')
+    row = dict(orth=orth, lemma=lemma, msd='', pos=pos, freq=0)
+    row.update(finn.split_values(orth))
+    row.update(finn.syllabify_values(orth))
+
+    return row
 
 
 # -----------------------------------------------------------------------------
@@ -2,21 +2,31 @@
 
 # standard library
 import csv
+import json
+import os
 import re
 
-from datetime import datetime
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
 from functools import wraps
 from math import ceil
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from threading import Event, Thread
+from time import sleep, time
 
 # installed
 from flask import (
     abort,
     flash,
     Flask,
+    jsonify,
     redirect,
     render_template,
     request,
+    Response,
     session,
+    stream_with_context,
     url_for,
     )
 from flaskext.markdown import Markdown
@@ -25,12 +35,34 @@ from flask.ext.seasurf import SeaSurf
 from flask.ext.sqlalchemy import SQLAlchemy
 from flask.ext.script import Manager
 from flask.ext.bcrypt import Bcrypt
-from sqlalchemy import or_
+from sqlalchemy import (
+    and_,
+    bindparam,
+    case,
+    cast,
+    distinct,
+    exists,
+    func,
+    literal,
+    or_,
+    tuple_,
+    )
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import contains_eager, joinedload, subqueryload
 from werkzeug.exceptions import BadRequestKeyError
 
 # local
-from syllabifier import FinnSyll, StressedFinnSyll
+import instrument
+
+from syllabifier import (
+    _FinnSyll,
+    Cache,
+    CACHE_DIR,
+    FinnSyll,
+    StressedFinnSyll,
+    Syllabifier,
+    )
 from utilities import encode
 
 app = Flask(__name__, static_folder='_static', template_folder='_templates')
@@ -49,6 +81,10 @@ csrf = SeaSurf(app)
 flask_bcrypt = Bcrypt(app)
 markdown = Markdown(app)
 
+# opt-in request instrumentation (see instrument.py)
+if app.config.get('INSTRUMENT'):
+    instrument.init_app(app, db)
+
 
 # FinnSyll Models -------------------------------------------------------------
 
@@ -115,107 +151,24 @@ class Token(db.Model):
     # an integer indicating to which fold the word belongs in cross-validation
     fold = db.Column(db.Integer, default=0)
 
-    # rules applied in test syllabifications ----------------------------------
-
-    rules1 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules2 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules3 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules4 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules5 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules6 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules7 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules8 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules9 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules10 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules11 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules12 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules13 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules14 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules15 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    rules16 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    # test syllabifications ---------------------------------------------------
-
-    test_syll1 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll2 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll3 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll4 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll5 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll6 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll7 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll8 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll9 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll10 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll11 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    test_syll12 = db.Column(db.String(80, convert_unicode=True), default='')
+    # syllabifications ---------------------------------------------------------
 
-    test_syll13 = db.Column(db.String(80, convert_unicode=True), default='')
+    # Each of the following arrays holds up to 16 strings, with no trailing
+    # empty strings. Their elements are also exposed as the attributes
+    # test_syll1-16, rules1-16, and syll1-16 (see Slot).
 
-    test_syll14 = db.Column(db.String(80, convert_unicode=True), default='')
+    # test syllabifications
+    test_syll = db.Column(postgresql.ARRAY(db.Text), default=[])
 
-    test_syll15 = db.Column(db.String(80, convert_unicode=True), default='')
+    # rules applied in test syllabifications (aligned with test_syll)
+    rules = db.Column(postgresql.ARRAY(db.Text), default=[])
 
-    test_syll16 = db.Column(db.String(80, convert_unicode=True), default='')
+    # correct syllabifications (hand-verified)
+    syll = db.Column(postgresql.ARRAY(db.Text), default=[])
 
-    # correct syllabifications (hand-verified) --------------------------------
-
-    syll1 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll2 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll3 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll4 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll5 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll6 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll7 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll8 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll9 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll10 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll11 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll12 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll13 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll14 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll15 = db.Column(db.String(80, convert_unicode=True), default='')
-
-    syll16 = db.Column(db.String(80, convert_unicode=True), default='')
+    # the distinct names of the rules applied across all of the test
+    # syllabifications, e.g., ['T1', 'T4'] (GIN-indexed for rule searches)
+    rule_set = db.Column(postgresql.ARRAY(db.Text), default=[])
 
     # -------------------------------------------------------------------------
 
@@ -277,6 +230,11 @@ class Token(db.Model):
         'order_by': [is_gold, is_complex, freq.desc()],
         }
 
+    # see also the lower(orth) and trigram indexes created in migrations
+    __table_args__ = (
+        db.Index('ix_Token_rule_set', 'rule_set', postgresql_using='gin'),
+        )
+
     def __init__(self, orth, **kwargs):
         self.orth = orth
 
@@ -306,18 +264,12 @@ class Token(db.Model):
 
     def split(self):
         '''Programmatically split Token.orth into any constituent words.'''
-        self.test_base = FinnSyll.split(self.orth.lower())
+        self.test_base = split_values(self.orth)['test_base']
 
     def syllabify(self):
         '''Programmatically syllabify Token.orth.'''
-        syllabifications = list(FinnSyll.syllabify(self.orth.lower()))
-
-        n = 16 - len(syllabifications)
-        syllabifications += [('', '') for i in range(n)]
-
-        for i, (test_syll, rules) in enumerate(syllabifications, start=1):
-            setattr(self, 'test_syll%i' % i, test_syll)
-            setattr(self, 'rules%i' % i, rules)
+        for attr, value in syllabify_values(self.orth).iteritems():
+            setattr(self, attr, value)
 
         if self.syll1:
             self.update_gold()
@@ -328,17 +280,11 @@ class Token(db.Model):
 
     def test_sylls(self):
         '''Return a set of all of the Token's test syllabifications.'''
-        test_sylls = [getattr(self, 'test_syll%i' % n) for n in range(1, 9)]
-        test_sylls = set(filter(None, test_sylls))
-
-        return test_sylls
+        return slot_set(self.test_syll)
 
     def sylls(self):
         '''Return a set of all of the Token's correct syllabifications.'''
-        sylls = [getattr(self, 'syll%i' % n) for n in range(1, 9)]
-        sylls = set(filter(None, sylls))
-
-        return sylls
+        return slot_set(self.syll)
 
     def correct(self, **kwargs):
         '''Save new attributes to the Token and update its gold status.'''
@@ -379,7 +325,7 @@ class Token(db.Model):
     @is_ambiguous.expression
     def is_ambiguous(cls):
         '''A boolean indicating if the Token exhibits T4 variation.'''
-        return cls.test_syll2 != ''
+        return func.array_length(cls.test_syll, 1) > 1
 
     # Evaluation properties ---------------------------------------------------
 
@@ -391,38 +337,76 @@ class Token(db.Model):
     @property
     def precision(self):
         '''See https://en.wikipedia.org/wiki/Precision_and_recall#Precision.'''
-        try:
-            return round(
-                len(self.test_sylls().intersection(self.sylls())) * 1.0 /
-                len(self.test_sylls()),
-                2)
-
-        except ZeroDivisionError:
-            return 0.0
+        return score(self.test_sylls(), self.sylls())[0]
 
     @property
     def recall(self):
         '''See https://en.wikipedia.org/wiki/Precision_and_recall#Recall.'''
-        try:
-            return round(
-                len(self.test_sylls().intersection(self.sylls())) * 1.0 /
-                len(self.sylls()),
-                2)
-
-        except ZeroDivisionError:
-            return 0.0
+        return score(self.test_sylls(), self.sylls())[1]
 
     @property
     def f1(self):
         '''See https://en.wikipedia.org/wiki/F1_score.'''
-        p = self.precision
-        r = self.recall
+        return score(self.test_sylls(), self.sylls())[2]
+
+    def tally(self):
+        '''Return the Token's contribution to the Performance statistics.'''
+        return performance_tally(
+            self.is_gold,
+            self.is_complex,
+            self.test_sylls(),
+            self.sylls(),
+            )
+
+
+class Slot(object):
+    '''Expose the n-th element of an array column as a string attribute.
+
+    E.g., Token.syll2 reads and writes Token.syll[1]. Missing elements read as
+    empty strings, and writes trim any trailing empty strings. In queries,
+    the slot compiles to the (1-indexed) array element.
+    '''
+
+    def __init__(self, column, n):
+        self.column = column
+        self.n = n
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return func.coalesce(getattr(cls, self.column)[self.n], '')
 
         try:
-            return 2.0 * (p * r) / (p + r)
+            return (getattr(obj, self.column) or [])[self.n - 1]
+
+        except IndexError:
+            return ''
+
+    def __set__(self, obj, value):
+        values = list(getattr(obj, self.column) or [])
+        values += [''] * (self.n - len(values))
+        values[self.n - 1] = value or ''
+
+        setattr(obj, self.column, trim(values))
+
+
+for n in range(1, 17):
+    for attr in ['test_syll', 'rules', 'syll']:
+        setattr(Token, '%s%i' % (attr, n), Slot(attr, n))
+
+
+def trim(values):
+    '''Return the list of strings "values" without trailing empty strings.'''
+    values = list(values)
 
-        except ZeroDivisionError:
-            return 0.0
+    while values and not values[-1]:
+        values.pop()
+
+    return values
+
+
+def slot_set(values):
+    '''Return the set of the first eight non-empty strings in "values".'''
+    return set(filter(None, (values or [])[:8]))
 
 
 class Document(db.Model):
@@ -436,20 +420,39 @@ class Document(db.Model):
     # a boolean indicating if all of the document's words have been reviewed
     reviewed = db.Column(db.Boolean, default=False)
 
-    # the text as a tokenized list, incl. Token IDs and punctuation strings
-    tokenized_text = db.Column(db.PickleType)
-
-    # a list of IDs for each word as they appear in the text
-    tokens = db.Column(db.PickleType)
+    # a one-to-many relationship with DocumentToken: the Token IDs and
+    # punctuation strings of the text, in order
+    positions = db.relationship(
+        'DocumentToken',
+        backref='_document',
+        order_by='DocumentToken.position',
+        cascade='all, delete-orphan',
+        )
 
     # number of unique Tokens that appear in the text
     unique_count = db.Column(db.Integer)
 
-    def __init__(self, filename, tokenized_text, tokens):
+    # number of unique Tokens in the text that are unverified, kept current
+    # as Tokens are verified (see decrement_unverified())
+    unverified_count = db.Column(db.Integer, default=0)
+
+    # the text's rendered html, cached until any of its Tokens is corrected
+    rendered = db.Column(db.Text)
+
+    # a counter incremented whenever the rendered html is invalidated, so
+    # that html rendered before a correction is never cached after it (see
+    # cache_rendered())
+    rendered_version = db.Column(db.Integer, default=0)
+
+    def __init__(self, filename, tokenized_text):
         self.filename = filename
-        self.tokenized_text = tokenized_text
-        self.tokens = tokens
-        self.unique_count = len(tokens)
+        self.positions = [
+            DocumentToken(**row) for row in text_positions(tokenized_text)]
+        ids = set(
+            p.token_id for p in self.positions if p.token_id is not None)
+        self.unique_count = len(ids)
+        self.unverified_count = Token.query.filter(
+            Token.id.in_(ids), Token.is_gold.is_(None)).count() if ids else 0
 
     def __repr__(self):
         return self.filename
@@ -459,14 +462,34 @@ class Document(db.Model):
 
     def query_document(self):
         '''Return a list of Tokens and puncts as they appear in the text.'''
-        tokens = {t.id: t for t in self.get_tokens()}
-        doc = [tokens.get(t, t) for t in self.tokenized_text]
-
-        return doc
+        # (the position keeps the rows of repeated Tokens distinct, since a
+        # query of an entity drops duplicate rows)
+        rows = db.session.query(
+            DocumentToken.position,
+            DocumentToken.string,
+            Token,
+            ) \
+            .outerjoin(Token, Token.id == DocumentToken.token_id) \
+            .filter(DocumentToken.document_id == self.id) \
+            .order_by(DocumentToken.position)
+
+        return [string if t is None else t for position, string, t in rows]
 
     def get_tokens(self):
         '''Return a list of the Tokens that appear in the text.'''
-        return db.session.query(Token).filter(Token.id.in_(self.tokens)).all()
+        ids = db.session.query(DocumentToken.token_id) \
+            .filter(DocumentToken.document_id == self.id)
+
+        return Token.query.filter(Token.id.in_(ids)).all()
+
+    def get_unverified_tokens(self):
+        '''Return a query of the text's unverified Tokens.'''
+        appears = exists().where(and_(
+            DocumentToken.document_id == self.id,
+            DocumentToken.token_id == Token.id,
+            ))
+
+        return Token.query.filter(Token.is_gold.is_(None), appears)
 
     def verify_all_unverified_tokens(self):
         '''For all of the text's unverified Tokens, set syll equal to test_syll.
@@ -474,32 +497,152 @@ class Document(db.Model):
         This function is intended for when all uverified Tokens have been
         correctly syllabified in test_syll. Proceed with caution.
         '''
-        tokens = self.get_tokens()
-
-        for token in tokens:
-            if token.is_gold is None:
-                token.correct(syll=token.test_syll)
+        tokens = self.get_unverified_tokens()
+        ids = tokens.with_entities(Token.id)
+
+        # adjust the Performance statistics and the Documents in which the
+        # Tokens appear before verifying them, since ids selects the
+        # unverified Tokens
+        adjust_approved_performances(tokens)
+        decrement_unverified(ids)
+        invalidate_documents(ids)
+
+        # since syll becomes test_syll, each Token is now gold
+        tokens.update(
+            {'syll': Token.test_syll, 'is_gold': True},
+            synchronize_session=False,
+            )
 
         self.reviewed = True
         db.session.commit()
 
     def update_review(self):
         '''Set reviewed to True if all of the Tokens have been verified.'''
-        tokens = self.get_tokens()
-        unverified_count = 0
-
-        for t in tokens:
-            if t.is_gold is None:
-                unverified_count += 1
-                break
-
         # if there are no unverified tokens but the document isn't marked as
         # reviewed, mark the document as reviewed; this would be the case if
         # all of the documents's tokens were verified in previous documents
-        if unverified_count == 0:
+        if not self.unverified_count:
             self.reviewed = True
 
 
+class DocumentToken(db.Model):
+    __tablename__ = 'DocumentToken'
+
+    # a one-to-many relationship with Document: many positions per Document
+    document_id = db.Column(
+        db.Integer,
+        db.ForeignKey('Document.id'),
+        primary_key=True,
+        )
+
+    # the position in the text, counting from 0
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    # the Token at this position, if any (indexed to find the Documents in
+    # which a Token appears)
+    token_id = db.Column(db.Integer, db.ForeignKey('Token.id'), index=True)
+
+    # otherwise, the punctuation, acronym, or number at this position
+    string = db.Column(db.Text)
+
+
+def text_positions(tokenized_text):
+    '''Return DocumentToken column values for a list of IDs and strings.'''
+    rows = []
+
+    for position, t in enumerate(tokenized_text):
+        if isinstance(t, (int, long)):
+            rows.append({'position': position, 'token_id': t, 'string': None})
+
+        else:
+            rows.append({'position': position, 'token_id': None, 'string': t})
+
+    return rows
+
+
+def decrement_unverified(token_ids):
+    '''Count the newly verified Tokens out of the Documents they appear in.
+
+    token_ids may be a list or a query of the IDs of Tokens that have just
+    been verified (or are about to be).
+    '''
+    counts = db.session.query(
+        DocumentToken.document_id,
+        func.count(distinct(DocumentToken.token_id)).label('n'),
+        ) \
+        .filter(DocumentToken.token_id.in_(token_ids)) \
+        .group_by(DocumentToken.document_id) \
+        .subquery()
+
+    Document.query.filter(Document.id == counts.c.document_id).update(
+        {'unverified_count': Document.unverified_count - counts.c.n},
+        synchronize_session=False,
+        )
+
+
+def count_unverified(document_ids=None):
+    '''Recount the unverified Tokens of the Documents (or of every one).'''
+    count = db.session.query(func.count(distinct(DocumentToken.token_id))) \
+        .join(Token, Token.id == DocumentToken.token_id) \
+        .filter(DocumentToken.document_id == Document.id) \
+        .filter(Token.is_gold.is_(None)) \
+        .correlate(Document) \
+        .as_scalar()
+    query = Document.query
+
+    if document_ids is not None:
+        query = query.filter(Document.id.in_(document_ids))
+
+    query.update({'unverified_count': count}, synchronize_session=False)
+
+
+@manager.command
+def recount_unverified():
+    '''Recount the unverified Tokens of every Document.'''
+    count_unverified()
+    db.session.commit()
+
+
+def invalidate_documents(token_ids=None):
+    '''Clear the rendered html of the Documents in which the Tokens appear.
+
+    If token_ids is None, clear the rendered html of every Document.
+    '''
+    query = Document.query
+
+    if token_ids is not None:
+        ids = db.session.query(DocumentToken.document_id) \
+            .filter(DocumentToken.token_id.in_(token_ids))
+        query = query.filter(Document.id.in_(ids))
+
+    # the version is bumped even where nothing is cached yet, since a view may
+    # be rendering the Document from its Tokens as they were before
+    query.update({
+        'rendered': None,
+        'rendered_version': Document.rendered_version + 1,
+        }, synchronize_session=False)
+
+
+def cache_rendered(doc_id, version, rendered):
+    '''Cache the rendered html of the Document with doc_id.
+
+    The html is written in a transaction of its own, so that a view can cache
+    it without committing whatever else its session holds. It is only stored
+    if the Document's rendered_version is still "version", as read before the
+    Tokens were, i.e., if none of its Tokens has been corrected since.
+    '''
+    table = Document.__table__
+    stmt = table.update() \
+        .where(and_(
+            table.c.id == doc_id,
+            table.c.rendered_version == version,
+            )) \
+        .values(rendered=rendered)
+
+    with db.engine.begin() as connection:
+        connection.execute(stmt)
+
+
 class Performance(db.Model):
     __tablename__ = 'Performance'
     id = db.Column(db.Integer, primary_key=True)
@@ -515,6 +658,26 @@ class Performance(db.Model):
     comp_verified = db.Column(db.Integer)
     comp_correct = db.Column(db.Integer)
 
+    # the sums of the verified tokens' precision, recall, and f1 scores, from
+    # which p, r, and f1 are averaged (these allow the statistics to be
+    # updated incrementally as tokens are corrected)
+    p_sum = db.Column(db.Float, default=0.0)
+    r_sum = db.Column(db.Float, default=0.0)
+    f1_sum = db.Column(db.Float, default=0.0)
+
+    # the statistics tallied over the verified tokens
+    TALLIED = [
+        'verified',
+        'correct',
+        'simp_verified',
+        'simp_correct',
+        'comp_verified',
+        'comp_correct',
+        'p_sum',
+        'r_sum',
+        'f1_sum',
+        ]
+
     def __init__(self,  **kwargs):
         self.total = 991730  # Token.query.filter_by(is_aamulehti=True).count()
         for attr, value in kwargs.iteritems():
@@ -542,6 +705,27 @@ class Performance(db.Model):
         '''Return complex accuracy.'''
         return (float(self.comp_correct) / self.comp_verified) * 100
 
+    def reset(self):
+        '''Zero out the tallied statistics.'''
+        for attr in self.TALLIED:
+            setattr(self, attr, 0)
+
+    def add(self, tally, sign=1):
+        '''Add (or, if sign is -1, subtract) a Token's tally.'''
+        for attr, value in tally.iteritems():
+            setattr(self, attr, (getattr(self, attr) or 0) + sign * value)
+
+    @staticmethod
+    def mean(total, verified):
+        '''Return SQL for the mean of the sum total over verified tokens.'''
+        return case(
+            [(verified == 0, 0.0)],
+            else_=cast(
+                func.round(cast(total, db.Numeric) / verified, 4),
+                db.Float,
+                ),
+            )
+
 
 # Poetry Models ---------------------------------------------------------------
 
@@ -655,10 +839,10 @@ class Section(db.Model):
         ))
 
     # a one-to-many relationship with Variant: many Variants per Section
+    # (see load_section to load them eagerly)
     variants = db.relationship(
         'Variant',
         backref='_section',
-        lazy='dynamic',
         )
 
     def __init__(self, **kwargs):
@@ -678,10 +862,13 @@ class Section(db.Model):
 
     def update_status(self):
         '''Update the section's review status.'''
-        verified = (v.verified for v in self.variants)
+        any_verified, all_verified = db.session.query(
+            func.bool_or(Variant.verified),
+            func.bool_and(Variant.verified),
+            ).filter(Variant.section_id == self.id).one()
 
-        if any(verified):
-            self.status = 'complete' if all(verified) else 'in-progress'
+        if any_verified:
+            self.status = 'complete' if all_verified else 'in-progress'
 
     def compose(self):
         '''Return Variants and words in the section's text (for frontend).'''
@@ -706,9 +893,13 @@ class Variant(db.Model):
     sequences = db.relationship(
         'VV',
         backref='_variant',
-        lazy='dynamic',
+        order_by='VV.id',
         )
 
+    # a boolean indicating if all of the Variant's VV sequences have been
+    # hand-verified (kept up to date by VV.correct)
+    verified = db.Column(db.Boolean, default=False)
+
     def __init__(self, **kwargs):
         for attr, value in kwargs.iteritems():
             if hasattr(self, attr):
@@ -725,11 +916,6 @@ class Variant(db.Model):
         '''Return the lowercase orth of the variant.'''
         return self._token.orth.lower()
 
-    @property
-    def verified(self):
-        '''A boolean indicating if this Variation has been hand-verified.'''
-        return all(seq.verified for seq in self.sequences)
-
 
 class VV(db.Model):
     __tablename__ = 'VV'
@@ -815,58 +1001,472 @@ class VV(db.Model):
         if split and scansion:
             self.verified = True
 
-        self._variant._section.update_status()
+        variant = self._variant
+        variant.verified = all(seq.verified for seq in variant.sequences)
+        variant._section.update_status()
+
+
+# Job Models ------------------------------------------------------------------
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # the name of the job's function in JOBS, e.g., 'poems_csv'
+    kind = db.Column(db.String(40), nullable=False)
+
+    # the arguments with which to call the job's function
+    args = db.Column(db.PickleType)
+
+    # the status of the job
+    status = db.Column(db.Enum(
+        u'queued',
+        u'running',
+        u'complete',
+        u'failed',
+        name='job_status',
+        convert_unicode=True,
+        ), default=u'queued', index=True)
+
+    # the job's result (e.g., the path of an export) or, if it failed, error
+    result = db.Column(db.Text, default='')
+
+    # when the job was queued, started, and finished
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+
+    # when the job's worker last reported that it was still running it
+    updated = db.Column(db.DateTime)
+
+    def __init__(self, kind, *args):
+        self.kind = kind
+        self.args = list(args)
+
+    def __repr__(self):
+        return '%s job %s (%s)' % (self.kind, self.id, self.status)
+
+    def __unicode__(self):
+        return self.__repr__()
+
+    def to_dict(self):
+        '''Return the job's status, for polling.'''
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': self.result,
+            }
+
+
+# Pagination Models -----------------------------------------------------------
+
+class Listing(db.Model):
+    __tablename__ = 'Listing'
+
+    # the name of the listing in LISTINGS, e.g., 'bad'
+    name = db.Column(db.String(40), primary_key=True)
+
+    # the number of rows per page
+    per_page = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    # the number of rows in the listing
+    count = db.Column(db.Integer)
+
+    # the sort keys of the last row of each page (see paginate())
+    bookmarks = db.Column(db.PickleType)
+
+    # when the count and bookmarks were computed
+    refreshed = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, name, per_page):
+        self.name = name
+        self.per_page = per_page
+
+    def __repr__(self):
+        return '%s listing (%s per page)' % (self.name, self.per_page)
+
+    def __unicode__(self):
+        return self.__repr__()
 
 
 # Database functions ----------------------------------------------------------
 
+def load_section(id):
+    '''Retrieve a Section and everything its view needs in three queries.
+
+    The first query joins the Section to its Book and Poet; the second
+    loads its Variants, joined to their Tokens; and the third loads the
+    Variants' VV sequences.
+    '''
+    return Section.query.filter_by(id=id).options(
+        joinedload('_book').joinedload('_poet'),
+        subqueryload('variants').joinedload('_token'),
+        subqueryload('variants').subqueryload('sequences'),
+        ).first_or_404()
+
+
+# the number of lowercase orths whose Token ids find_token_ids() remembers
+TOKEN_CACHE_SIZE = 2 ** 16
+
+TOKEN_IDS = Cache(TOKEN_CACHE_SIZE)
+
+# the number of orths looked up per query by find_token_ids()
+FIND_BATCH_SIZE = 10000
+
+
 def find_token(orth):
-    '''Retrieve a token by its orthography.'''
-    try:
-        # ilike queries are case insensitive
-        token = Token.query.filter(Token.orth.ilike(orth)).first()
-        return token
+    '''Retrieve a token by its orthography (case insensitively).'''
+    id = find_token_ids([orth]).get(orth.lower())
+    token = Token.query.get(id) if id else None
+
+    # forget the ids of Tokens that have since been deleted
+    if id and not token:
+        TOKEN_IDS.data.pop(orth.lower(), None)
+        return find_token(orth)
+
+    return token
+
+
+def find_token_ids(orths):
+    '''Return a dict of the lowercase orths and the ids of their Tokens.
+
+    Orths without Tokens are left out. Tokens are matched on lower(orth),
+    which is indexed, in batches of "= ANY(...)" queries; when several
+    Tokens share a lowercase orth, the first in Token's default ordering
+    wins. Only the ids of found Tokens are cached, so that Tokens created
+    later are never missed.
+    '''
+    ids, missing = {}, []
+
+    for orth in set(o.lower() for o in orths):
+        id = TOKEN_IDS.find(orth)
+
+        if id:
+            ids[orth] = id
+
+        else:
+            missing.append(orth)
+
+    for i in xrange(0, len(missing), FIND_BATCH_SIZE):
+        batch = missing[i:i + FIND_BATCH_SIZE]
+        lower = func.lower(Token.orth)
+        rows = db.session.query(lower, Token.id).filter(lower == func.any(
+            bindparam('orths', batch, type_=postgresql.ARRAY(db.Text)),
+            )).order_by(Token.is_gold, Token.is_complex, Token.freq.desc())
+
+        for orth, id in rows:
+            if orth not in ids:
+                ids[orth] = id
+                TOKEN_IDS.put(orth, id)
+
+    return ids
 
-    except KeyError:
-        return None
 
+def split_values(orth):
+    '''Return the Token column values produced by splitting "orth".'''
+    return {'test_base': FinnSyll.split(orth.lower())}
 
-def adjust(func):
+
+def syllabify_values(orth):
+    '''Return the Token column values produced by syllabifying "orth".'''
+    syllabifications = list(FinnSyll.syllabify(orth.lower()))[:16]
+    rules = [r for _, r in syllabifications]
+
+    return {
+        'test_syll': [s for s, _ in syllabifications],
+        'rules': rules,
+        'rule_set': get_rule_set(rules),
+        }
+
+
+def get_rule_set(rules):
+    '''Return the distinct rule names that appear in the strings "rules".'''
+    return sorted(set(re.findall(r'T[a-z0-9]+', ' '.join(rules))))
+
+
+def annotate_word(word):
+    '''Return the syllabifications of "word" with their rules, stresses,
+    weights, and vowel qualities (all memoized by the FinnSyll caches).'''
+    syllabifications = StressedFinnSyll.syllabify(word)
+    annotations = _FinnSyll.annotate(word)
+
+    return {
+        'word': word,
+        'syllabifications': [
+            {
+                'syll': syll,
+                'rules': rules,
+                'stress': stress,
+                'weights': weights,
+                'vowels': vowels,
+                }
+            for (syll, rules), (_, stress, weights, vowels)
+            in zip(syllabifications, annotations)
+            ],
+        }
+
+
+def adjust(func, batch_size=1000):
     '''Adjust tokens by applying func to each token.'''
-    count = Token.query.count()
-    start = 0
-    end = x = 1000
+    last_id = 0
 
-    while start + x < count:
-        for token in Token.query.order_by(Token.id).slice(start, end):
+    while True:
+        # page by keyset rather than by offset, so that each batch costs the
+        # same no matter how deep into the table it lies
+        tokens = Token.query.filter(Token.id > last_id) \
+            .order_by(Token.id) \
+            .limit(batch_size) \
+            .all()
+
+        if not tokens:
+            break
+
+        for token in tokens:
             func(token)
 
         db.session.commit()
-        start = end
-        end += x
+        last_id = tokens[-1].id
+
+
+# Bulk updates ----------------------------------------------------------------
+
+CHECKPOINTS = 'records/checkpoints'
+
+
+def bulk_adjust(
+        name,
+        columns,
+        func,
+        batch_size=1000,
+        workers=1,
+        resume=False,
+        ):
+    '''Apply func to Token rows in keyset-paginated batches, outside the ORM.
+
+    Each batch selects Token.id and "columns" as plain tuples and passes each
+    tuple to func, which returns a dict of new column values for that row.
+    The batch is then written back as a single executemany UPDATE. The id of
+    the last row written is checkpointed under "name", so that an
+    interrupted run can pick up where it left off with resume=True.
+
+    If workers > 1, each round hands one batch to each of "workers" worker
+    processes; while the workers compute a round, the parent writes the
+    results of the previous one.
+    '''
+    last_id = read_checkpoint(name) if resume else 0
+    total = db.session.query(Token.id).filter(Token.id > last_id).count()
+    done = rounds = 0
+    started = time()
+
+    pool = Pool(workers, initializer=init_worker) if workers > 1 else None
+    pending = None
+
+    try:
+        while True:
+            shards = []
+
+            for i in range(workers):
+                rows = select_batch(columns, last_id, batch_size)
+
+                if not rows:
+                    break
+
+                shards.append((func, rows))
+                last_id = rows[-1][0]
+
+            if pool and shards:
+                job = pool.map_async(_apply_to_shard, shards)
+
+            else:
+                job = map(_apply_to_shard, shards)
+
+            # write the previous round while the workers compute this one
+            if pending:
+                done += write_round(name, *pending)
+                rounds += 1
+
+                if rounds % 10 == 0 or done == total:
+                    report_progress(done, total, started)
+
+            if not shards:
+                break
+
+            pending = job, last_id
 
-    for token in Token.query.order_by(Token.id).slice(start, count):
-        func(token)
+    except BaseException:
+        if pool:
+            pool.terminate()
+
+        raise
+
+    # let the workers exit on their own, so that they save their caches
+    if pool:
+        pool.close()
+        pool.join()
+
+    clear_checkpoint(name)
+
+
+def select_batch(columns, last_id, batch_size):
+    '''Return the next batch of (Token.id, *columns) tuples after last_id.'''
+    rows = db.session.query(Token.id, *columns) \
+        .filter(Token.id > last_id) \
+        .order_by(Token.id) \
+        .limit(batch_size)
+
+    return [tuple(row) for row in rows]
+
+
+def write_round(name, job, last_id):
+    '''Write a round of computed shards and checkpoint its last Token.id.'''
+    results = job.get() if hasattr(job, 'get') else job
+    count = 0
+
+    for values in results:
+        bulk_update(Token, values)
+        count += len(values)
 
     db.session.commit()
+    write_checkpoint(name, last_id)
+
+    return count
+
+
+def init_worker():
+    '''Give each worker process its own FinnSyll instance.'''
+    global FinnSyll
+    FinnSyll = Syllabifier(rules=True)
+
+    if CACHE_DIR:
+        FinnSyll.load_cache(CACHE_DIR)
+
+        # a worker exits without running its atexit hooks, but it does run
+        # multiprocessing's finalizers if its Pool is closed and joined
+        Finalize(None, FinnSyll.save_cache, args=(CACHE_DIR, ), exitpriority=0)
+
+
+def _apply_to_shard(shard):
+    # (func, rows) -> [{'_id': id, column: value, ...}, ...]
+    func, rows = shard
+
+    return [dict(func(row), _id=row[0]) for row in rows]
+
+
+def bulk_update(model, values):
+    '''Write a list of column-value dicts, keyed by "_id", to model's table.
+
+    Dicts that set the same columns share a single executemany UPDATE.
+    '''
+    table = model.__table__
+    stmt = table.update().where(table.c.id == bindparam('_id'))
+    groups = {}
+
+    for row in values:
+        groups.setdefault(frozenset(row), []).append(row)
+
+    for rows in groups.itervalues():
+        db.session.execute(stmt, rows)
+
+
+def report_progress(done, total, started):
+    '''Print the number of rows processed so far and the rows per second.'''
+    elapsed = time() - started
+    rate = done / elapsed if elapsed else 0.0
+
+    print '%s/%s rows (%.1f rows/sec)' % (
+        format(done, ',d'),
+        format(total, ',d'),
+        rate,
+        )
+
+
+def checkpoint_path(name):
+    '''Return the path of the checkpoint file for the bulk job "name".'''
+    return os.path.join(CHECKPOINTS, name)
+
+
+def read_checkpoint(name):
+    '''Return the last Token.id processed by the bulk job "name", or 0.'''
+    try:
+        with open(checkpoint_path(name), 'r') as f:
+            return int(f.read())
+
+    except (IOError, ValueError):
+        return 0
+
+
+def write_checkpoint(name, last_id):
+    '''Record last_id as the last Token.id processed by the bulk job "name".'''
+    if not os.path.isdir(CHECKPOINTS):
+        os.makedirs(CHECKPOINTS)
+
+    with open(checkpoint_path(name), 'w') as f:
+        f.write(str(last_id))
+
+
+def clear_checkpoint(name):
+    '''Delete the checkpoint file for the bulk job "name".'''
+    try:
+        os.remove(checkpoint_path(name))
+
+    except OSError:
+        pass
+
+
+def _split_row(row):
+    # (id, orth) -> test_base
+    return split_values(row[1])
+
+
+def _syllabify_row(row):
+    # (id, orth, syll) -> test_syll, rules, rule_set, and is_gold
+    values = syllabify_values(row[1])
+    syll = row[2]
+
+    if syll and syll[0]:
+        values['is_gold'] = slot_set(syll) == slot_set(values['test_syll'])
+
+    return values
 
 
 @manager.command
-def split_compounds():
+def split_compounds(workers=1, resume=False):
     '''Split all tokens.'''
     print 'Splitting compounds... ' + datetime.utcnow().strftime('%I:%M')
 
-    adjust(func=lambda t: t.split())
+    bulk_adjust(
+        'split_compounds',
+        [Token.orth],
+        _split_row,
+        workers=int(workers),
+        resume=resume,
+        )
+
+    # the Documents' rendered texts are now stale
+    invalidate_documents()
+    db.session.commit()
 
     print 'Splitting complete. ' + datetime.utcnow().strftime('%I:%M')
 
 
 @manager.command
-def syllabify_tokens():
+def syllabify_tokens(workers=1, resume=False):
     '''Syllabify all tokens.'''
     print 'Syllabifying... ' + datetime.utcnow().strftime('%I:%M')
 
-    adjust(func=lambda t: t.syllabify())
+    bulk_adjust(
+        'syllabify_tokens',
+        [Token.orth, Token.syll],
+        _syllabify_row,
+        workers=int(workers),
+        resume=resume,
+        )
+
+    # the Documents' rendered texts are now stale
+    invalidate_documents()
+    db.session.commit()
 
     print 'Syllabifications complete. ' + datetime.utcnow().strftime('%I:%M')
 
@@ -877,34 +1477,424 @@ def syllabify_tokens():
 @manager.command
 def update_performance():
     '''Calculate average precision, recall, f1, and accuracy.'''
-    for with_loanwords in (True, False):
-        P = Performance.query.filter_by(with_loanwords=with_loanwords).first()
+    performances = Performance.query.all()
+
+    for P in performances:
+        P.reset()
+
+    # tally both loanword settings in a single pass over a projection of the
+    # verified tokens
+    rows = get_gold_tokens(db.session.query(
+        Token.is_gold,
+        Token.is_complex,
+        Token.is_loanword,
+        Token.test_syll,
+        Token.syll,
+        ))
+
+    for row in rows.yield_per(10000):
+        tally = performance_tally(
+            row[0],
+            row[1],
+            slot_set(row[3]),
+            slot_set(row[4]),
+            )
+
+        for P in performances:
+            if P.with_loanwords or not row[2]:
+                P.add(tally)
+
+    db.session.flush()
+
+    Performance.query.update({
+        stat: Performance.mean(
+            getattr(Performance, stat + '_sum'),
+            Performance.verified,
+            )
+        for stat in ['p', 'r', 'f1']
+        }, synchronize_session=False)
+
+    db.session.commit()
+
+
+def adjust_performance(token, before):
+    '''Update the Performance statistics by the change in token's tally.
+
+    "before" is the token's tally prior to its correction. This lets
+    apply_form() keep the statistics current without recalculating them.
+    '''
+    adjust_performances([(token, before)])
+
+
+def adjust_performances(changes):
+    '''Update the Performance statistics for a list of (token, before).'''
+    deltas = {True: Counter(), False: Counter()}
+
+    for token, before in changes:
+        after = token.tally()
+
+        if before == after:
+            continue
+
+        for with_loanwords, delta in deltas.iteritems():
+            if with_loanwords or not token.is_loanword:
+                delta.subtract(before)
+                delta.update(after)
+
+    increment_performances(deltas)
+
+
+def adjust_approved_performances(tokens):
+    '''Add the unverified tokens to the Performance statistics as approved.
+
+    Approving a token sets its syll to its test_syll, making it gold, so its
+    tally depends only on is_complex and on whether it has any test
+    syllabifications. The tokens are counted by those (and is_loanword) in a
+    single aggregate query, rather than loaded.
+    '''
+    has_sylls = func.coalesce(
+        func.array_to_string(Token.test_syll[1:8], ''), '') != ''
+    groups = tokens \
+        .with_entities(
+            Token.is_complex,
+            Token.is_loanword,
+            has_sylls,
+            func.count(Token.id),
+            ) \
+        .group_by(Token.is_complex, Token.is_loanword, has_sylls) \
+        .all()
+
+    deltas = {True: Counter(), False: Counter()}
+
+    for is_complex, is_loanword, has_sylls, count in groups:
+        sylls = set([u'*']) if has_sylls else set()
+        tally = performance_tally(True, is_complex, sylls, sylls)
+
+        for with_loanwords, delta in deltas.iteritems():
+            if with_loanwords or not is_loanword:
+                delta.update({attr: value * count
+                              for attr, value in tally.items()})
+
+    increment_performances(deltas)
+
+
+def increment_performances(deltas):
+    '''Add the tallies in deltas, keyed by with_loanwords, to Performance.
+
+    Each Performance row is changed by a single UPDATE that adds to its
+    stored counts and sums and averages the new sums, so that corrections
+    saved at the same time cannot overwrite one another's totals.
+    '''
+    for with_loanwords, delta in deltas.iteritems():
+        if not any(delta.itervalues()):
+            continue
+
+        values = {
+            attr: func.coalesce(getattr(Performance, attr), 0)
+            + delta.get(attr, 0)
+            for attr in Performance.TALLIED
+            }
+
+        # an UPDATE's expressions read the row's old values, so the averages
+        # are taken over the expressions for the new sums
+        for stat in ['p', 'r', 'f1']:
+            values[stat] = Performance.mean(
+                values[stat + '_sum'], values['verified'])
+
+        Performance.query \
+            .filter_by(with_loanwords=with_loanwords) \
+            .update(values, synchronize_session=False)
+
+
+def score(test_sylls, sylls):
+    '''Return the precision, recall, and f1 of the set test_sylls.'''
+    correct = len(test_sylls.intersection(sylls)) * 1.0
+
+    try:
+        p = round(correct / len(test_sylls), 2)
+
+    except ZeroDivisionError:
+        p = 0.0
+
+    try:
+        r = round(correct / len(sylls), 2)
+
+    except ZeroDivisionError:
+        r = 0.0
+
+    try:
+        f1 = 2.0 * (p * r) / (p + r)
+
+    except ZeroDivisionError:
+        f1 = 0.0
 
-        calculate = lambda t: round(float(sum(t)) / P.verified, 4)
+    return p, r, f1
 
-        verified_tokens = get_gold_tokens()
 
-        if not with_loanwords:
-            verified_tokens = verified_tokens.filter_by(is_loanword=False)
+def performance_tally(is_gold, is_complex, test_sylls, sylls):
+    '''Return a token's contribution to the Performance statistics.'''
+    if is_gold is None:
+        return {}
 
-        correct_tokens = verified_tokens.filter_by(is_gold=True)
+    p, r, f1 = score(test_sylls, sylls)
+    correct = 1 if is_gold else 0
 
-        P.verified = verified_tokens.count()
-        P.correct = correct_tokens.count()
+    return {
+        'verified': 1,
+        'correct': correct,
+        'simp_verified': 1 if is_complex is False else 0,
+        'simp_correct': correct if is_complex is False else 0,
+        'comp_verified': 1 if is_complex else 0,
+        'comp_correct': correct if is_complex else 0,
+        'p_sum': p,
+        'r_sum': r,
+        'f1_sum': f1,
+        }
+
+
+# Background jobs -------------------------------------------------------------
+
+# the functions that Jobs can run, by kind
+JOBS = {}
+
+# the seconds between the heartbeats of a running Job (see run_job())
+JOB_HEARTBEAT = 60
+
+# the seconds after its last heartbeat at which a running Job is presumed
+# abandoned (e.g., because its worker was restarted mid-job), so that an
+# identical Job can be queued
+JOB_TIMEOUT = 10 * 60
+
+
+def job(func):
+    # Register func as a kind of background Job
+    JOBS[func.func_name] = func
+
+    return func
+
+
+def pending_job(kind, *args):
+    '''Return the queued or running Job of kind with args, if there is one.
+
+    Running Jobs whose last heartbeat is older than JOB_TIMEOUT are ignored.
+    '''
+    running = and_(Job.status == u'running', Job.updated >= job_cutoff())
+    pending = Job.query.filter_by(kind=kind) \
+        .filter(or_(Job.status == u'queued', running)) \
+        .order_by(Job.id)
+
+    for j in pending:
+        if j.args == list(args):
+            return j
+
+
+def enqueue(kind, *args):
+    '''Queue a Job, unless an identical one is already queued or running.'''
+    j = pending_job(kind, *args)
+
+    if j:
+        return j
 
-        P.simp_verified = verified_tokens.filter_by(is_complex=False).count()
-        P.simp_correct = correct_tokens.filter_by(is_complex=False).count()
+    j = Job(kind, *args)
+    db.session.add(j)
+    db.session.commit()
+
+    return j
 
-        P.comp_verified = verified_tokens.filter_by(is_complex=True).count()
-        P.comp_correct = correct_tokens.filter_by(is_complex=True).count()
 
-        P.p = calculate([t.precision for t in verified_tokens])
-        P.r = calculate([t.recall for t in verified_tokens])
-        P.f1 = calculate([t.f1 for t in verified_tokens])
+def job_cutoff():
+    '''Return the time before which a running Job is presumed abandoned.'''
+    return datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT)
 
+
+def fail_abandoned_jobs():
+    '''Mark the running Jobs without a heartbeat in JOB_TIMEOUT as failed.'''
+    abandoned = Job.query \
+        .filter(Job.status == u'running', Job.updated < job_cutoff())
+    abandoned.update(
+        {
+            'status': u'failed',
+            'result': u'abandoned',
+            'finished': datetime.utcnow(),
+            },
+        synchronize_session=False,
+        )
     db.session.commit()
 
 
+def claim_job():
+    '''Mark the oldest queued Job as running and return it, if there is one.
+
+    First, any abandoned Jobs are marked as failed.
+    '''
+    fail_abandoned_jobs()
+
+    for j in Job.query.filter_by(status=u'queued').order_by(Job.id).limit(5):
+
+        # only one worker can move a job out of the queue
+        now = datetime.utcnow()
+        claimed = Job.query.filter_by(id=j.id, status=u'queued').update(
+            {'status': u'running', 'started': now, 'updated': now},
+            synchronize_session=False,
+            )
+        db.session.commit()
+
+        if claimed:
+            return Job.query.get(j.id)
+
+
+def run_job(j):
+    '''Run the Job j, recording its result or the error it raised.
+
+    While the Job runs, a thread records its heartbeat. If the Job has been
+    presumed abandoned and failed in the meantime, its result is discarded.
+    '''
+    stop = Event()
+    heartbeat = Thread(target=beat, args=(j.id, stop))
+    heartbeat.daemon = True
+    heartbeat.start()
+
+    try:
+        result = JOBS[j.kind](*j.args)
+        values = {'status': u'complete', 'result': unicode(result or '')}
+
+    except Exception as error:
+        db.session.rollback()
+        values = {'status': u'failed', 'result': unicode(repr(error))}
+
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    values['finished'] = datetime.utcnow()
+    Job.query.filter_by(id=j.id, status=u'running') \
+        .update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def beat(job_id, stop):
+    '''Record the heartbeat of a running Job every JOB_HEARTBEAT seconds.
+
+    The heartbeats are written on a connection of their own, until the Event
+    "stop" is set.
+    '''
+    table = Job.__table__
+    stmt = table.update() \
+        .where(and_(table.c.id == job_id, table.c.status == u'running'))
+
+    while not stop.wait(JOB_HEARTBEAT):
+        with db.engine.begin() as connection:
+            connection.execute(stmt.values(updated=datetime.utcnow()))
+
+
+@manager.command
+def run_jobs(poll=2.0, once=False):
+    '''Run queued Jobs as they arrive (run alongside the web workers).'''
+    while True:
+        j = claim_job()
+
+        if j:
+            print 'Running %s... ' % j + datetime.utcnow().strftime('%I:%M')
+            run_job(j)
+
+        elif once:
+            break
+
+        else:
+            db.session.remove()
+            sleep(float(poll))
+
+
+@job
+def poems_csv(filename='_static/data/poetry.csv'):
+    '''Write the verified VV sequences to the poetry csv.'''
+    # select only the needed columns, joining each sequence to its poet and
+    # token up front rather than lazy-loading them one sequence at a time
+    rows = db.session.query(
+        Poet.surname,
+        VV.sequence,
+        Token.orth,
+        VV.split,
+        VV.scansion,
+        VV.is_heavy,
+        VV.is_stressed,
+        VV.line,
+        ) \
+        .select_from(VV) \
+        .join(Poet, Poet.id == VV.poet_id) \
+        .join(Variant, Variant.id == VV.variant_id) \
+        .join(Token, Token.id == Variant.token_id) \
+        .filter(VV.verified == True) \
+        .order_by(VV.id)  # noqa
+
+    # write to a temporary file first, so that downloads never see a
+    # partially written csv
+    with open(filename + '.tmp', 'wb') as f:
+        writer = csv.writer(f, delimiter=',')
+
+        # add the header row with column titles
+        writer.writerow([
+            'poet',
+            'sequence',
+            'word',
+            'split',
+            'joined',
+            'unknown',
+            'scansion',
+            'is_heavy',
+            'primary_stress',
+            'line',
+            ])
+
+        # add rows
+        for surname, sequence, orth, split, scansion, is_heavy, \
+                is_stressed, line in rows.yield_per(1000):
+            writer.writerow([
+                # poet
+                encode(surname),
+
+                # sequence
+                encode(sequence),
+
+                # word
+                encode(orth),
+
+                # is_joined
+                1 if split == 'split' else 0,
+
+                # is_split
+                1 if split == 'join' else 0,
+
+                # is_unsure
+                1 if split == 'unknown' else 0,
+
+                # scansion
+                scansion,
+
+                # sb.follows
+                1 if is_heavy else 0,
+
+                # is_word_initial
+                1 if is_stressed else 0,
+
+                # the line of poetry in which the sequence appears
+                encode(re.sub(r'^\s+', '', line)),
+            ])
+
+    os.rename(filename + '.tmp', filename)
+
+    return filename
+
+
+@job
+def approve_doc(id):
+    '''For all of the doc's unverified Tokens, set syll equal to test_syll.'''
+    doc = Document.query.get(id)
+    doc.verify_all_unverified_tokens()
+
+    return doc.filename
+
+
 # Datasets --------------------------------------------------------------------
 
 def training_set():
@@ -1032,19 +2022,13 @@ def apply_form(http_form, commit=True):
     # Apply changes to Token instance based on POST request
     try:
         token = Token.query.get(http_form['id'])
-        syll1 = http_form['syll1']
-        syll2 = http_form.get('syll2', '')
-        syll3 = http_form.get('syll3', '')
-        syll4 = http_form.get('syll4', '')
-        note = http_form.get('note', '')
-
-        token.correct(
-            syll1=syll1,
-            syll2=syll2,
-            syll3=syll3,
-            syll4=syll4,
-            note=note,
-            )
+        before = correct_token(token, http_form)
+        adjust_performance(token, before)
+        invalidate_documents([token.id])
+
+        # an unverified Token's tally is empty
+        if not before:
+            decrement_unverified([token.id])
 
         if commit:
             db.session.commit()
@@ -1053,23 +2037,107 @@ def apply_form(http_form, commit=True):
         pass
 
 
+def correct_token(token, http_form):
+    '''Apply the corrections in http_form to token, returning its prior tally.
+
+    Raise a KeyError if http_form lacks syll1.
+    '''
+    syll1 = http_form['syll1']
+    before = token.tally()
+
+    token.correct(
+        syll1=syll1,
+        syll2=http_form.get('syll2', ''),
+        syll3=http_form.get('syll3', ''),
+        syll4=http_form.get('syll4', ''),
+        note=http_form.get('note', ''),
+        )
+
+    return before
+
+
+# the Token columns that Token.correct() changes
+CORRECTED = ['syll', 'note', 'is_gold']
+
+
 def apply_bulk_form(http_form):
-    # Apply changes to multiple Token instances based on POST request
-    forms = {k: {} for k in range(1, 41)}
+    '''Apply changes to multiple Token instances based on POST request.
+
+    The submitted Tokens are loaded in one query and corrected in memory,
+    and their new values are written in one executemany UPDATE. Return a
+    dict of validation errors by row (1-40); rows with errors are skipped.
+    '''
+    forms, errors = {}, {}
 
     for i in range(1, 41):
+        form = {}
+
         for attr in ['id', 'syll1', 'syll2', 'syll3', 'syll4', 'note']:
             try:
-                forms[i][attr] = http_form['%s_%s' % (attr, i)]
+                form[attr] = http_form['%s_%s' % (attr, i)]
 
             except BadRequestKeyError:
                 pass
 
-    for form in forms.itervalues():
-        apply_form(form, commit=False)
+        # skip blank rows
+        if not form.get('id'):
+            continue
+
+        try:
+            form['id'] = int(form['id'])
+            forms[i] = form
+
+        except ValueError:
+            errors[i] = 'Invalid token id: %s' % form['id']
+
+    ids = set(form['id'] for form in forms.itervalues())
+    tokens = Token.query.filter(Token.id.in_(ids)).all() if ids else []
+    tokens = {t.id: t for t in tokens}
+    changes = OrderedDict()
+
+    for i, form in sorted(forms.iteritems()):
+        token = tokens.get(form['id'])
+
+        if token is None:
+            errors[i] = 'No token with id %s' % form['id']
+            continue
+
+        try:
+            before = correct_token(token, form)
+
+        except KeyError:
+            errors[i] = 'Missing syll1 for token %s' % token.id
+            continue
+
+        # if a token is submitted twice, its first tally is the one before
+        changes.setdefault(token, before)
+
+    # write the Tokens in one executemany UPDATE; with autoflush off, and the
+    # Tokens expunged before the commit, the session never flushes them one
+    # UPDATE at a time
+    with db.session.no_autoflush:
+        if changes:
+            adjust_performances(changes.items())
+            invalidate_documents([t.id for t in changes])
+
+            # an unverified Token's tally is empty
+            verified = [t.id for t, b in changes.iteritems() if not b]
+
+            if verified:
+                decrement_unverified(verified)
+
+            bulk_update(Token, [
+                dict({c: getattr(t, c) for c in CORRECTED}, _id=t.id)
+                for t in changes
+                ])
+
+        for t in changes:
+            db.session.expunge(t)
 
     db.session.commit()
 
+    return errors
+
 
 def perform_search(find, search_type):  # noqa
     '''Perform query from search box.'''
@@ -1110,12 +2178,14 @@ def perform_search(find, search_type):  # noqa
             else:
                 results = results.filter(Token.gold_base.contains(query))
 
-        # case-insensitive search
-        else:
-            if search_type == 'contains':
-                query = '%' + query + '%'
+        # case-insensitive search (served by the orth trigram index)
+        elif search_type == 'contains':
+            results = results.filter(Token.orth.ilike('%' + query + '%'))
 
-            results = results.filter(Token.orth.ilike(query))
+        # case-insensitive exact search (served by the lower(orth) index)
+        else:
+            query = query.decode('utf-8').lower()
+            results = results.filter(func.lower(Token.orth) == query)
 
     elif '*' == find:
         # return gold tokens
@@ -1126,10 +2196,8 @@ def perform_search(find, search_type):  # noqa
         results = Token.query.filter(0 == 1)
 
     # filter results by rules
-    for r in rules:
-        results = results.filter(or_(
-            getattr(Token, 'rules%s' % n).contains(r) for n in range(1, 17)
-        ))
+    if rules:
+        results = results.filter(Token.rule_set.contains(rules))
 
     return results
 
@@ -1164,6 +2232,64 @@ def syllabify_view():
         )
 
 
+# the maximum number of words per /syllabify/batch request
+BATCH_MAX_WORDS = 50000
+
+# the number of words annotated (and, if streaming, written) at a time
+BATCH_CHUNK_SIZE = 500
+
+
+@csrf.exempt
+@app.route('/syllabify/batch', methods=['POST', ])
+@login_required
+def syllabify_batch_view():
+    '''Syllabify and annotate a JSON list of words, for scripts.
+
+    The request body is either a list of words or {"words": [...]}. Words are
+    stripped, lowercased, and deduplicated, and the response lists each word
+    once, in the order in which it first appears. With ?format=ndjson (or
+    "Accept: application/x-ndjson"), the words are streamed back one JSON
+    object per line, a chunk at a time.
+
+    Since the body must be sent as application/json, which HTML forms
+    cannot do, the view is exempt from the CSRF token.
+    '''
+    data = request.get_json(silent=True)
+
+    if isinstance(data, dict):
+        data = data.get('words')
+
+    if not isinstance(data, list) or \
+            not all(isinstance(w, basestring) for w in data):
+        abort(400)
+
+    if len(data) > BATCH_MAX_WORDS:
+        abort(413)
+
+    words = (w.strip().lower() for w in data)
+    words = OrderedDict((w, None) for w in words if w).keys()
+
+    def annotate_chunks():
+        for i in xrange(0, len(words), BATCH_CHUNK_SIZE):
+            yield [annotate_word(w) for w in words[i:i + BATCH_CHUNK_SIZE]]
+
+    if request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == 'application/x-ndjson':
+
+        def stream():
+            for chunk in annotate_chunks():
+                yield ''.join(json.dumps(result) + '\n' for result in chunk)
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype='application/x-ndjson',
+            )
+
+    results = [result for chunk in annotate_chunks() for result in chunk]
+
+    return jsonify(count=len(data), unique=len(words), results=results)
+
+
 @app.route('/rules', methods=['GET', ])
 @login_required
 def rules_view():
@@ -1179,14 +2305,24 @@ def doc_view(id):
         apply_form(request.form)
 
     doc = Document.query.get_or_404(id)
-    TEXT = doc.query_document()
+    rendered = doc.rendered
+    version = doc.rendered_version
+
+    # render the text only if it has changed since it was last rendered
+    if rendered is None:
+        rendered = render_template('text.html', TEXT=doc.query_document())
+        cache_rendered(doc.id, version, rendered)
 
     scroll = request.form.get('scroll', None)
 
+    # an approval of the doc that has yet to finish, if any
+    approval = pending_job('approve_doc', doc.id)
+
     return render_template(
         'doc.html',
         doc=doc,
-        TEXT=TEXT,
+        rendered=rendered,
+        approval=approval,
         kw='doc',
         scroll=scroll,
         )
@@ -1197,11 +2333,30 @@ def doc_view(id):
 def approve_doc_view(id):
     '''For all of the doc's unverified Tokens, set syll equal to test_syll.'''
     doc = Document.query.get_or_404(id)
-    doc.verify_all_unverified_tokens()
+
+    # approve the tokens in the background (see run_jobs)
+    enqueue('approve_doc', doc.id)
 
     return redirect(url_for('doc_view', id=id))
 
 
+@app.route('/jobs/<int:id>', methods=['GET', ])
+@login_required
+def job_view(id):
+    '''Return the status of a background Job, for polling.'''
+    return jsonify(Job.query.get_or_404(id).to_dict())
+
+
+@app.route('/instrumentation', methods=['GET', ])
+@login_required
+def instrumentation_view():
+    '''Return the instrumentation of recent requests (see instrument.py).'''
+    if not app.config.get('INSTRUMENT'):
+        abort(404)
+
+    return jsonify(instrument.summary(request.args.get('n', 50, type=int)))
+
+
 @app.route('/search', methods=['GET', 'POST'])
 @login_required
 def search_view():
@@ -1234,6 +2389,24 @@ def search_view():
         )
 
 
+# the sort keys of the /bad listing, in the order of is_bad_split (nulls
+# last) and then note descending (nulls first); the keys are all descending
+# and not null, so that they can be sought as a row
+BAD_KEYS = [
+    (~func.coalesce(Token.is_bad_split, True), True),
+    (Token.is_bad_split.isnot(None), True),
+    (Token.note.is_(None), True),
+    (func.coalesce(Token.note, ''), True),
+    ]
+
+# the paginated Token listings, by kw: a function returning the listing's
+# query, and the listing's sort keys (see paginate())
+LISTINGS = {
+    'bad': (get_bad_tokens, BAD_KEYS),
+    'notes': (get_notes, [(Token.note, False), ]),
+    }
+
+
 @app.route('/<kw>', defaults={'page': 1}, methods=['GET', 'POST'])
 @app.route('/<kw>/page/<int:page>', methods=['GET', 'POST'])
 @login_required
@@ -1245,11 +2418,7 @@ def token_view(kw, page):
         apply_form(request.form)
 
     if kw == 'bad':
-        # retrieve all mis-syllabified tokens
-        tokens = get_bad_tokens().order_by(
-            Token.is_bad_split,
-            Token.note.desc(),
-            )
+        # retrieve all mis-syllabified tokens, listing bad splits last
         description = (
             'This page lists words that have <i>imperfect</i> precision and '
             'recall'
@@ -1257,14 +2426,13 @@ def token_view(kw, page):
 
     elif kw == 'notes':
         # retrieve tokens that contain any notes
-        tokens = get_notes()
         description = 'This page lists words containing <i>notes</i>.'
 
     else:
         abort(404)
 
-    count = format(tokens.count(), ',d')
-    tokens, pagination = paginate(page, tokens)
+    tokens, pagination = paginate(page, kw)
+    count = format(pagination.total_count, ',d')
 
     return render_template(
         'tokens.html',
@@ -1318,17 +2486,27 @@ def poems_view():
     '''Return the books of poetry to form a Table of Contents.'''
     sections = (
         Section.query.join(Book).join(Poet)
+        .options(contains_eager('_book').contains_eager('_poet'))
         .order_by(Poet.surname, Section.id)
         )
 
-    return render_template('poems.html', sections=sections, kw='poems')
+    # the number of VV sequences in each book
+    counts = dict(
+        db.session.query(VV.book_id, func.count(VV.id)).group_by(VV.book_id))
+
+    return render_template(
+        'poems.html',
+        sections=sections,
+        counts=counts,
+        kw='poems',
+        )
 
 
 @app.route('/poems/<id>', methods=['GET', ])
 @login_required
 def poem_view(id):
     '''Present a detail view of the book excerpt, composed of editable VV.'''
-    section = Section.query.get_or_404(id)
+    section = load_section(id)
     text = section.compose()
 
     return render_template('poem.html', section=section, text=text, kw='poem')
@@ -1351,8 +2529,16 @@ def poem_edit_view():
             except BadRequestKeyError as e:
                 print '********', e
 
+    # load the sequences along with their variant and section up front
+    ids = [form['id'] for form in forms.itervalues()]
+    sequences = VV.query.filter(VV.id.in_(ids)).options(
+        joinedload('_variant').joinedload('_section'),
+        joinedload('_variant').subqueryload('sequences'),
+        )
+    sequences = {str(seq.id): seq for seq in sequences}
+
     for form in forms.itervalues():
-        seq = VV.query.get(form['id'])
+        seq = sequences[form['id']]
         seq.correct(
             split=form['split'],
             scansion=form['scansion'],
@@ -1374,7 +2560,7 @@ def poem_edit_view():
         )
 
     try:
-        response += '%s,' * 5 + ');' % (
+        response += ('%s,' * 5 + ');') % (
             str(variant.sequences[1].id),
             '"' + variant.sequences[1].html + '"',
             '"' + str(variant.sequences[1].split) + '"',
@@ -1393,65 +2579,8 @@ def poem_edit_view():
 @app.route('/poems-csv', methods=['GET', ])
 @login_required
 def poems_csv_view():
-    '''Generate the poetry csv for download.'''
-    try:
-        filename = '_static/data/poetry.csv'
-
-        # write the poetry data to file
-        with open(filename, 'wb') as f:
-            writer = csv.writer(f, delimiter=',')
-
-            # add the header row with column titles
-            writer.writerow([
-                'poet',
-                'sequence',
-                'word',
-                'split',
-                'joined',
-                'unknown',
-                'scansion',
-                'is_heavy',
-                'primary_stress',
-                'line',
-                ])
-
-            # add rows
-            for vv in VV.query.filter_by(verified=True):
-                writer.writerow([
-                    # poet
-                    encode(vv._poet.surname),
-
-                    # sequence
-                    encode(vv.sequence),
-
-                    # word
-                    encode(vv._variant._token.orth),
-
-                    # is_joined
-                    1 if vv.split == 'split' else 0,
-
-                    # is_split
-                    1 if vv.split == 'join' else 0,
-
-                    # is_unsure
-                    1 if vv.split == 'unknown' else 0,
-
-                    # scansion
-                    vv.scansion,
-
-                    # sb.follows
-                    1 if vv.is_heavy else 0,
-
-                    # is_word_initial
-                    1 if vv.is_stressed else 0,
-
-                    # the line of poetry in which the sequence appears
-                    encode(re.sub(r'^\s+', '', vv.line)),
-                ])
-            return 'Success!', 200
-
-    except Exception as response:
-        return response, 500
+    '''Queue the poetry csv for generation, returning the Job to poll.'''
+    return jsonify(enqueue('poems_csv').to_dict()), 202
 
 
 # Jinja2 ----------------------------------------------------------------------
@@ -1535,23 +2664,125 @@ class Pagination(object):
                 last = num
 
 
-def paginate(page, tokens, per_page=40):
-    count = tokens.count()
-    start = (page - 1) * per_page or 0
-    end = min(start + per_page, count)
+def paginate(page, name, per_page=40):
+    '''Return the page-th page of the listing "name", and a Pagination.
 
-    try:
-        tokens = tokens[start:end]
+    The listing's tokens are sorted by its keys in LISTINGS, a list of
+    (column, descending) pairs, to which Token.id is appended as a
+    tie-breaker (in the same direction as the last key); the columns must not
+    be null. Rather than by OFFSET, each page is fetched by seeking past the
+    last row of the previous page, whose keys are bookmarked (see
+    get_bookmarks), so that deep pages are as fast to serve as the first.
+    '''
+    get_tokens, keys = LISTINGS[name]
+    tokens, keys = get_tokens(), listing_keys(keys)
+    count, bookmarks = get_bookmarks(tokens, keys, name, per_page)
 
-    except IndexError:
-        if page != 1:
+    if page > 1:
+        try:
+            tokens = tokens.filter(seek(keys, bookmarks[page - 2]))
+
+        except IndexError:
             abort(404)
 
+    tokens = tokens.order_by(None).order_by(*ordering(keys))
+    tokens = tokens.limit(per_page).all()
     pagination = Pagination(page, per_page, count)
 
     return tokens, pagination
 
 
+def listing_keys(keys):
+    '''Return a listing's sort keys, with Token.id as the tie-breaker.'''
+    return keys + [(Token.id, keys[-1][1]), ]
+
+
+# the seconds after which a listing's count and bookmarks are recomputed; they
+# are computed in a single pass over the listing's keys, so the count and page
+# boundaries are approximate for about this long
+BOOKMARK_TTL = 300
+
+
+def get_bookmarks(tokens, keys, name, per_page):
+    '''Return the count of tokens and the keys of the last row of each page.
+
+    These are kept in the Listing table, shared by the web workers, and are
+    recomputed by a background Job (see refresh_listing) once they are
+    BOOKMARK_TTL seconds old, so that serving a page never scans the
+    listing. Until the Job first stores them, they are computed here.
+    '''
+    listing = Listing.query.get((name, per_page))
+    stale = datetime.utcnow() - timedelta(seconds=BOOKMARK_TTL)
+
+    if listing is None or listing.refreshed < stale:
+        enqueue('refresh_listing', name, per_page)
+
+    if listing is None:
+        return scan_bookmarks(tokens, keys, per_page)
+
+    return listing.count, listing.bookmarks
+
+
+def scan_bookmarks(tokens, keys, per_page):
+    '''Compute the count and bookmarks of tokens in a scan of their keys.'''
+    # number the rows in a single scan, keeping every per_page-th row's keys
+    n = func.row_number().over(order_by=ordering(keys)).label('n')
+    columns = [column.label('k%i' % i) for i, (column, _) in enumerate(keys)]
+    rows = tokens.order_by(None).with_entities(n, *columns).subquery()
+    rows = db.session.query(*list(rows.c)[1:]) \
+        .filter(rows.c.n % per_page == 0) \
+        .order_by(rows.c.n)
+
+    count = tokens.order_by(None).count()
+    bookmarks = [tuple(row) for row in rows]
+
+    return count, bookmarks
+
+
+@job
+def refresh_listing(name, per_page):
+    '''Recompute and store the count and bookmarks of a listing.'''
+    get_tokens, keys = LISTINGS[name]
+    keys = listing_keys(keys)
+    count, bookmarks = scan_bookmarks(get_tokens(), keys, per_page)
+
+    listing = Listing.query.get((name, per_page)) or Listing(name, per_page)
+    listing.count, listing.bookmarks = count, bookmarks
+    listing.refreshed = datetime.utcnow()
+    db.session.add(listing)
+    db.session.commit()
+
+
+def ordering(keys):
+    '''Return the ORDER BY clauses for a list of (column, descending) keys.'''
+    return [column.desc() if desc else column for column, desc in keys]
+
+
+def seek(keys, values):
+    '''Return a filter for the rows that sort after the keys "values".'''
+    # (wrapped, since SQLAlchemy won't compare against a bare boolean)
+    values = [literal(value) for value in values]
+
+    # if the keys share a direction, compare them as a row, which Postgres
+    # can seek to in an index on the keys
+    if len(set(desc for _, desc in keys)) == 1:
+        columns, values = tuple_(*[c for c, _ in keys]), tuple_(*values)
+
+        return columns < values if keys[0][1] else columns > values
+
+    clause = None
+
+    for (column, desc), value in reversed(zip(keys, values)):
+        after = column < value if desc else column > value
+
+        if clause is not None:
+            after = or_(after, and_(column == value, clause))
+
+        clause = after
+
+    return clause
+
+
 def url_for_other_page(page):
     args = request.view_args.copy()
     args['page'] = page
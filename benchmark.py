@@ -0,0 +1,368 @@
+# coding=utf-8
+
+import gutenberg
+import hashlib
+import json
+import os
+import re
+import sys
+
+from collections import OrderedDict
+from frame import get_annotations
+from syllabifier import (
+    _FinnSyll,
+    Cache,
+    finnsyll_version,
+    FinnSyll,
+    INSTANCES,
+    StressedFinnSyll,
+    )
+from tabulate import tabulate
+from time import time
+
+# the number of words drawn from the corpus for the word list
+WORDS = 2000
+
+# the file in which baselines are saved
+BASELINE = 'benchmark.json'
+
+# a benchmark regresses if its words per second fall more than this fraction
+# below the baseline
+TOLERANCE = 0.2
+
+PERCENTILES = [50, 90, 99]
+
+# the words of the corpus, for the word list
+WORD = re.compile(u'[a-zäö]+(?:-[a-zäö]+)*')
+
+
+# Benchmarks ------------------------------------------------------------------
+
+# name -> (function, whether it is called per word or per section)
+BENCHMARKS = OrderedDict([
+    ('FinnSyll.syllabify', (FinnSyll.syllabify, 'words')),
+    ('FinnSyll.split', (FinnSyll.split, 'words')),
+    ('StressedFinnSyll.syllabify', (StressedFinnSyll.syllabify, 'words')),
+    ('_FinnSyll.annotate', (_FinnSyll.annotate, 'words')),
+    ('frame.get_annotations', (get_annotations, 'words')),
+    ('gutenberg._tokenize_text', (gutenberg._tokenize_text, 'sections')),
+    ])
+
+
+def run(repeat=5, n=WORDS, names=None):
+    '''Time each benchmark, returning the results and the inputs' metadata.
+
+    Neither the word list nor the sections touch the database: both are read
+    from the gutenberg/ corpus. The FinnSyll caches are emptied before each
+    run, so that every word is syllabified anew.
+    '''
+    inputs = {'words': get_words(n), 'sections': get_sections()}
+    results = OrderedDict()
+
+    for name, (func, kind) in BENCHMARKS.iteritems():
+        if names and name not in names:
+            continue
+
+        args = inputs[kind]
+        words = len(args) if kind == 'words' else count_words(args)
+        best = None
+        latencies = []
+
+        for i in range(repeat):
+            clear_caches()
+            elapsed, times = time_calls(func, args)
+            best = elapsed if best is None else min(best, elapsed)
+            latencies.extend(times)
+
+        results[name] = summarize(words, best, latencies)
+
+    meta = {
+        'finnsyll': finnsyll_version(),
+        'python': sys.version.split()[0],
+        'words': len(inputs['words']),
+        'digest': digest(inputs['words']),
+        'sections': len(inputs['sections']),
+        'repeat': repeat,
+        }
+
+    return {'meta': meta, 'results': results}
+
+
+def time_calls(func, args):
+    '''Call func on each arg, returning the total and per-call seconds.'''
+    times = []
+
+    for arg in args:
+        started = time()
+        func(arg)
+        times.append(time() - started)
+
+    return sum(times), times
+
+
+def summarize(words, elapsed, latencies):
+    '''Return the words per second and the latency percentiles (in ms).'''
+    latencies = sorted(latencies)
+    summary = OrderedDict([('words_per_sec', round(words / elapsed, 1))])
+
+    for p in PERCENTILES:
+        summary['p%s_ms' % p] = round(percentile(latencies, p) * 1000, 4)
+
+    summary['max_ms'] = round(latencies[-1] * 1000, 4)
+
+    return summary
+
+
+def percentile(values, p):
+    '''Return the p-th percentile of the sorted list values (nearest rank).'''
+    i = int(round(p / 100.0 * len(values) + 0.5)) - 1
+
+    return values[max(0, min(i, len(values) - 1))]
+
+
+def clear_caches():
+    '''Empty the caches of each FinnSyll instance.'''
+    for instance in INSTANCES:
+        for method, cache in instance.caches.items():
+            instance.caches[method] = Cache(cache.maxsize)
+
+
+# Inputs ----------------------------------------------------------------------
+
+def get_books():
+    '''Return the filepaths of the books in the corpus, in sorted order.'''
+    directory = gutenberg.GUTENBERG
+
+    filenames = sorted(os.listdir(directory))
+
+    return [os.path.join(directory, fn) for fn in filenames]
+
+
+def get_words(n=WORDS):
+    '''Return a fixed list of n distinct words drawn from the corpus.
+
+    The words are spread evenly over the corpus's sorted vocabulary, so that
+    the list is the same from run to run.
+    '''
+    vocabulary = set()
+
+    for fp in get_books():
+        surname, title, text = gutenberg.parse_book(fp)
+        text = text.decode('utf-8', 'replace').lower()
+        vocabulary.update(WORD.findall(text))
+
+    vocabulary = sorted(vocabulary)
+    step = max(1, len(vocabulary) / n)
+
+    return vocabulary[::step][:n]
+
+
+def get_sections():
+    '''Return the text of each section in the corpus.'''
+    sections = []
+
+    for fp in get_books():
+        surname, title, text = gutenberg.parse_book(fp)
+        sections.extend(gutenberg._divide_text(text))
+
+    return sections
+
+
+def count_words(sections):
+    '''Return the number of (whitespace-separated) words in sections.'''
+    return sum(len(s.split()) for s in sections)
+
+
+def digest(words):
+    '''Return a digest of the word list, to tell whether runs compare.'''
+    return hashlib.md5(u'\n'.join(words).encode('utf-8')).hexdigest()[:12]
+
+
+# Baselines -------------------------------------------------------------------
+
+def save(report, filename=BASELINE):
+    '''Save report as the baseline.'''
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print 'Saved the baseline to %s' % filename
+
+
+def load(filename=BASELINE):
+    '''Return the saved baseline, or None if there isn't one.'''
+    try:
+        with open(filename) as f:
+            return json.load(f, object_pairs_hook=OrderedDict)
+
+    except IOError:
+        return None
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    '''Print report against baseline, returning the regressed benchmarks.'''
+    for key in ['finnsyll', 'digest', 'sections']:
+        if report['meta'][key] != baseline['meta'].get(key):
+            print 'WARNING: the baseline has a different %s' % key
+
+    table = [['benchmark', 'words/sec', 'baseline', 'change'] + [
+        'p%s (ms)' % p for p in PERCENTILES]]
+    regressions = []
+
+    for name, result in report['results'].iteritems():
+        before = baseline['results'].get(name)
+        row = [name, result['words_per_sec']]
+
+        if before:
+            change = result['words_per_sec'] / before['words_per_sec'] - 1
+            row += [before['words_per_sec'], '%+.1f%%' % (change * 100)]
+
+            if change < -tolerance:
+                regressions.append(name)
+                row[-1] += ' !'
+
+        else:
+            row += ['', '']
+
+        table.append(row + [result['p%s_ms' % p] for p in PERCENTILES])
+
+    print tabulate(table, headers='firstrow')
+
+    return regressions
+
+
+def report_table(report):
+    '''Print report.'''
+    headers = ['benchmark', 'words/sec'] + [
+        'p%s (ms)' % p for p in PERCENTILES] + ['max (ms)']
+    table = [headers] + [
+        [name] + result.values()
+        for name, result in report['results'].iteritems()]
+
+    print tabulate(table, headers='firstrow')
+
+
+# Tokenizer -------------------------------------------------------------------
+
+def compare_tokenizers(repeat=5):
+    '''Compare gutenberg._tokenize_text with the previous tokenizer.
+
+    Both tokenizers are timed over every section of the gutenberg/ corpus
+    (the best of "repeat" runs), and their output is checked to be the same.
+    '''
+    sections = get_sections()
+    words = count_words(sections)
+    print '%s sections, %s words' % (len(sections), words)
+
+    results = {}
+
+    for name, func in [
+            ('before', _tokenize_text_before),
+            ('after', gutenberg._tokenize_text),
+            ]:
+        best = None
+
+        for i in range(repeat):
+            started = time()
+            output = [func(s, []) for s in sections]
+            elapsed = time() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        results[name] = output
+        print '%s:\t%.3fs\t%.0f words/sec' % (name, best, words / best)
+
+    if results['before'] != results['after']:
+        print 'WARNING: the tokenizers disagree'
+
+
+def _tokenize_text_before(section_text, words):
+    # the previous gutenberg._tokenize_text, kept as the baseline: it splits
+    # each line with an uncompiled pattern, scans each word separately for
+    # diphthongs, and concatenates strings with +=
+    tokenized_text = []
+    string = ''
+
+    for line in section_text.split('\n'):
+
+        if not line:
+            string += '<br>'
+            continue
+
+        string += '<div>'
+
+        line = filter(None, re.split(
+            r'(\r\n|[ ]+|[%s]|--)' % gutenberg.PUNCTUATION,
+            line,
+            ))
+
+        for word in line:
+            word = word.decode('utf-8', errors='replace')
+
+            if len(word) > 1 and word == len(word) * ' ':
+                string += '&nbsp;' * len(word)
+                continue
+
+            if word == word.upper():
+                string += word
+                continue
+
+            word = word.lower()
+            sequences = list(re.finditer(
+                r'(?=([^aäoöieuy]{1}|^)(au|eu|ou|iu|iy|ey|äy|öy)([^aäoöieuy]{1}|$))',  # noqa
+                word.encode('utf-8'),
+                ))
+
+            if sequences and all(
+                    1 if i in gutenberg.CHARACTERS else 0 for i in word):
+                tokenized_text.append(string)
+                string = ''
+                tokenized_text.append(len(words))
+                words.append((word, [
+                    gutenberg._get_sequence(
+                        seq.group(2).decode('utf-8'),
+                        len(word.encode('utf-8')[:seq.start(2)].decode(
+                            'utf-8')),
+                        word,
+                        )
+                    for seq in sequences]))
+
+            else:
+                string += word
+
+        string += '</div>'
+
+    tokenized_text.append(string)
+
+    return tokenized_text
+
+
+def _option(name, default=None):
+    # the value of the command line option "name" (e.g., "--repeat=")
+    values = [a.split('=', 1)[1] for a in sys.argv if a.startswith(name)]
+
+    return values[0] if values else default
+
+
+if __name__ == '__main__':
+    # python benchmark.py [--repeat=n] [--words=n] [--only=name,name]
+    #   [--baseline=filename] [--save] [--tolerance=fraction] [--tokenizers]
+    repeat = int(_option('--repeat=', 5))
+
+    if '--tokenizers' in sys.argv:
+        compare_tokenizers(repeat=repeat)
+        sys.exit()
+
+    filename = _option('--baseline=', BASELINE)
+    names = _option('--only=')
+    report = run(
+        repeat=repeat,
+        n=int(_option('--words=', WORDS)),
+        names=names.split(',') if names else None,
+        )
+    baseline = load(filename)
+
+    if '--save' in sys.argv or not baseline:
+        report_table(report)
+        save(report, filename)
+
+    elif compare(report, baseline, float(_option('--tolerance=', TOLERANCE))):
+        sys.exit(1)
@@ -3,9 +3,19 @@
 import sys
 
 from datetime import datetime
+from multiprocessing import cpu_count, Pool
 from tabulate import tabulate
 
-from app import db, get_gold_tokens, Token  # noqa
+from app import (  # noqa
+    db,
+    get_gold_tokens,
+    init_worker,
+    score,
+    split_values,
+    syllabify_values,
+    Token,
+    )
+from snapshot import Gold, gold_order, load
 
 
 # supply Test and Query objects with several methods
@@ -45,10 +55,16 @@ class Table(object):
 # test changes to the syllabifier
 class Test(Table):
 
-    def __init__(self, pdf=False):
+    def __init__(self, pdf=False, detached=False, workers=None, snapshot=None):
         self.report = None
         self.tokens = get_gold_tokens()
-        self.test_transition()
+
+        # evaluating a gold set snapshot file is necessarily detached
+        if detached or snapshot:
+            self.test_detached_transition(workers or cpu_count(), snapshot)
+
+        else:
+            self.test_transition()
 
         if pdf:
             # create filename
@@ -99,8 +115,49 @@ class Test(Table):
         # compose the report
         self.get_report(pre_acc, post_acc, bad_to_good, good_to_bad)
 
-    def get_report(self, pre_acc, post_acc, bad_to_good, good_to_bad):
+    def test_detached_transition(self, workers, snapshot=None):
+        '''Re-syllabify a snapshot of the gold tokens and generate a report.
+
+        Unlike test_transition(), this never modifies the ORM Tokens: the gold
+        set is read once as a snapshot of plain tuples (from a snapshot file,
+        if one is given), which are split and syllabified across a pool of
+        worker processes.
+        '''
+        if snapshot:
+            gold = load(snapshot).gold()
+
+        else:
+            gold = gold_snapshot(self.tokens)
+            db.session.close()
+
+        pool = Pool(workers, initializer=init_worker)
+        tokens = pool.map(evaluate, gold, chunksize=500)
+        pool.close()
+        pool.join()
+
+        # calculate the overall accuracy prior to and after the transition
+        verified = len(tokens)
+        pre_acc = (float(sum(t._is_gold for t in tokens)) / verified) * 100
+        post_acc = (float(sum(t.is_gold for t in tokens)) / verified) * 100
+
+        # curate a list of all of the tokens whose gold statuses have changed
+        changed = [t for t in tokens if t._is_gold != t.is_gold]
+
+        # create tables for tokens that have changed from bad to good and
+        # from good to bad
+        bad_to_good = self.get_table(changed, lambda t: t.is_gold)
+        good_to_bad = self.get_table(changed, lambda t: not t.is_gold)
+
+        # compose the report
+        bad = len([t for t in tokens if not t.is_gold])
+        self.get_report(pre_acc, post_acc, bad_to_good, good_to_bad, bad)
+
+    def get_report(self, pre_acc, post_acc, bad_to_good, good_to_bad,
+                   bad=None):
         '''Generate an error report.'''
+        if bad is None:
+            bad = self.tokens.filter_by(is_gold=False).count()
+
         # tabulate tables
         bad_to_good_table = self.tabulate(bad_to_good)
         good_to_bad_table = self.tabulate(good_to_bad)
@@ -120,7 +177,7 @@ class Test(Table):
             bad_to_good_table,
             len(good_to_bad) - 1,
             good_to_bad_table,
-            self.tokens.filter_by(is_gold=False).count(),
+            bad,
             )
 
         print self.report
@@ -167,6 +224,92 @@ class Test(Table):
         return row
 
 
+# evaluate gold tokens outside of the ORM
+class Evaluation(object):
+    '''A re-syllabified gold token, alongside its previous results.
+
+    Evaluations mimic the attributes of a transitioned Token in
+    Test.test_transition(): the previous results are prefixed with "_".
+    '''
+
+    def __init__(self, gold, **kwargs):
+        self.orth = gold.orth
+        self.lemma = gold.lemma
+        self.is_complex = gold.is_complex
+        self.gold_base = gold.gold_base
+
+        for n in range(16):
+            setattr(self, '_test_syll%i' % (n + 1), gold.test_sylls[n])
+            setattr(self, '_rules%i' % (n + 1), gold.rules[n])
+
+        self._is_gold = gold.is_gold
+        self._p_r = p_r(gold.test_sylls, gold.sylls)
+
+        self.__dict__.update(kwargs)
+
+    @property
+    def is_split(self):
+        return '=' in self.test_base
+
+
+def gold_snapshot(tokens):
+    '''Return a list of Gold tuples for the Tokens in the query "tokens".'''
+    columns = [
+        Token.orth,
+        Token.lemma,
+        Token.is_gold,
+        Token.is_complex,
+        Token.gold_base,
+        Token.test_base,
+        Token.syll,
+        Token.test_syll,
+        Token.rules,
+        ]
+
+    # preserve Token's default ordering, as snapshot files do
+    rows = tokens.with_entities(*columns).order_by(*gold_order())
+
+    return [Gold(*(row[:6] + tuple(pad(arr) for arr in row[6:])))
+            for row in rows]
+
+
+def evaluate(gold):
+    '''Split and syllabify a Gold tuple, returning an Evaluation.'''
+    values = split_values(gold.orth)
+    values.update(syllabify_values(gold.orth))
+
+    test_sylls = pad(values.pop('test_syll'))
+    rules = pad(values.pop('rules'))
+
+    for n in range(16):
+        values['test_syll%i' % (n + 1)] = test_sylls[n]
+        values['rules%i' % (n + 1)] = rules[n]
+
+    values['is_gold'] = sylls(gold.sylls) == sylls(test_sylls)
+    values['p_r'] = p_r(test_sylls, gold.sylls)
+
+    return Evaluation(gold, **values)
+
+
+def pad(values):
+    '''Return a tuple of the 16 slots of an array column, e.g., Token.syll.'''
+    values = tuple(values or ())
+
+    return values + ('', ) * (16 - len(values))
+
+
+def sylls(syllabifications):
+    '''Return the set of the first eight syllabifications, as Token does.'''
+    return set(filter(None, syllabifications[:8]))
+
+
+def p_r(test_sylls, gold_sylls):
+    '''Return a string repr of precision and recall (P / R), as Token does.'''
+    p, r, f1 = score(sylls(test_sylls), sylls(gold_sylls))
+
+    return '%s / %s' % (round(p, 2), round(r, 2))
+
+
 # create tabulated queries
 class Query(Table):
 
@@ -230,7 +373,14 @@ class Query(Table):
 
 
 if __name__ == '__main__':
-    Test(pdf='--pdf' in sys.argv)
+    # python eval.py [--pdf] [--detached] [--snapshot=filename]
+    snapshot = [a.split('=', 1)[1] for a in sys.argv if '--snapshot=' in a]
+
+    Test(
+        pdf='--pdf' in sys.argv,
+        detached='--detached' in sys.argv,
+        snapshot=snapshot[0] if snapshot else None,
+        )
 
     # tokens = get_gold_tokens()
 
@@ -1,10 +1,15 @@
 # coding=utf-8
 
 import csv
+import os
+import shutil
+import sys
 
 from datetime import datetime
+from multiprocessing import cpu_count, Pool
 
 from app import Token
+from snapshot import load
 from syllabifier import _FinnSyll
 from utilities import encode
 
@@ -63,28 +68,184 @@ def get_syll_count(stress):
 
 # data frame generation -------------------------------------------------------
 
-def generate_data_frame(filename='./_static/data/aamulehti-1999.csv'):
-    '''Generate the data frame!'''
+# the number of rows written to each part of the data frame
+CHUNK_SIZE = 50000
 
-    # write data frame to file
-    with open(filename, 'wb') as f:
+# the Token attributes that make up a row
+COLUMNS = [
+    'orth',
+    'freq',
+    'pos',
+    'msd',
+    'lemma',
+    'is_gold',
+    'note',
+    'syll1',
+    'syll2',
+    'syll3',
+    ]
+
+
+def generate_data_frame(
+        filename='./_static/data/aamulehti-1999.csv',
+        snapshot=None,
+        workers=None,
+        resume=False,
+        columnar=None,
+        ):
+    '''Generate the data frame!
+
+    If "snapshot" names a gold set snapshot file, the gold rows are read from
+    it rather than from the database.
+
+    Each distinct lemma and word is annotated only once, across a pool of
+    "workers" processes. The rows are written in chunks of CHUNK_SIZE, each to
+    its own part file in "<filename>.parts", and the parts are concatenated
+    into filename once all of them are written. If "resume", the parts
+    written by an earlier, interrupted run are kept rather than rewritten.
+
+    If "columnar" is 'parquet' or 'feather', the data frame is also written
+    in that format, alongside the CSV (this requires pandas and pyarrow).
+    '''
+    parts = filename + '.parts'
+
+    if not resume:
+        shutil.rmtree(parts, ignore_errors=True)
+
+    if not os.path.isdir(parts):
+        os.makedirs(parts)
+
+    # fork the workers before any rows are streamed from the database
+    pool = Pool(workers or cpu_count())
+    annotations = {}
+
+    for i, chunk in enumerate(get_chunks(snapshot)):
+        part = os.path.join(parts, '%05i.csv' % i)
+
+        if os.path.exists(part):
+            continue
+
+        annotate(chunk, annotations, pool)
+        write_part(part, chunk, annotations)
+
+    pool.close()
+
+    join_parts(filename, parts)
+
+    if columnar:
+        write_columnar(filename, columnar)
+
+
+def get_chunks(snapshot=None):
+    '''Yield lists of (is-gold-row, token) pairs, CHUNK_SIZE at a time.'''
+    chunk = []
+    rows = [(True, get_gold_rows(snapshot)), (False, get_unverified_rows())]
+
+    for gold, tokens in rows:
+        for t in tokens:
+            chunk.append((gold, t))
+
+            if len(chunk) == CHUNK_SIZE:
+                yield chunk
+                chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def get_gold_rows(snapshot=None):
+    '''Return the Aamulehti gold tokens, from a snapshot file if specified.'''
+    if snapshot:
+        rows = [t for t in load(snapshot) if t.is_aamulehti]
+        rows.sort(key=lambda t: (not t.is_gold, t.orth))
+
+        return rows
+
+    return project(Token.query.filter(Token.is_gold.isnot(None))) \
+        .filter_by(is_aamulehti=True) \
+        .order_by(Token.is_gold.desc(), Token.orth, Token.id) \
+        .yield_per(10000)
+
+
+def get_unverified_rows():
+    '''Return the unverified Aamulehti tokens.'''
+    return project(Token.query.filter_by(is_gold=None, is_aamulehti=True)) \
+        .order_by(Token.orth, Token.id) \
+        .yield_per(10000)
+
+
+def project(tokens):
+    '''Query only the COLUMNS of tokens, streaming them from the server.'''
+    columns = [getattr(Token, attr).label(attr) for attr in COLUMNS]
+
+    return tokens.with_entities(*columns) \
+        .execution_options(stream_results=True)
+
+
+def annotate(rows, annotations, pool):
+    '''Annotate the lemmas and words in rows missing from annotations.'''
+    words = set()
+
+    for gold, t in rows:
+        words.add(t.lemma.lower())
+        words.add(t.orth.lower())
+
+    words = [w for w in words if w not in annotations]
+    annotations.update(
+        zip(words, pool.map(get_annotations, words, chunksize=500)))
+
+
+def write_part(filename, rows, annotations):
+    '''Write rows to a part file, which only exists once it is complete.'''
+    with open(filename + '.tmp', 'wb') as f:
         writer = csv.writer(f, delimiter=',')
 
-        # add the header row with column titles
-        writer.writerow(get_headers())
+        for gold, t in rows:
+            if gold:
+                writer.writerow(get_gold_row(t, annotations))
+
+            else:
+                writer.writerow(get_row(t, annotations))
+
+    os.rename(filename + '.tmp', filename)
 
-        # add gold rows
-        for t in Token.query.filter(Token.is_gold.isnot(None)) \
-                .filter_by(is_aamulehti=True) \
-                .order_by(Token.is_gold.desc(), Token.orth) \
-                .yield_per(1000):
-            writer.writerow(get_gold_row(t))
 
-        # add non-gold rows
-        for t in Token.query.filter_by(is_gold=None, is_aamulehti=True) \
-                .order_by(Token.orth) \
-                .yield_per(1000):
-            writer.writerow(get_row(t))
+def join_parts(filename, parts):
+    '''Concatenate the header row and the part files into filename.'''
+    with open(filename + '.tmp', 'wb') as f:
+        csv.writer(f, delimiter=',').writerow(get_headers())
+
+        for part in sorted(os.listdir(parts)):
+            if part.endswith('.csv'):
+                with open(os.path.join(parts, part), 'rb') as p:
+                    shutil.copyfileobj(p, f)
+
+    os.rename(filename + '.tmp', filename)
+    shutil.rmtree(parts)
+
+
+def write_columnar(filename, columnar):
+    '''Write the CSV data frame at filename as a Parquet or Feather file.'''
+    try:
+        import pandas as pd
+
+    except ImportError:
+        raise ImportError('Writing %s files requires pandas.' % columnar)
+
+    # read everything but the frequencies as strings, since several columns
+    # mix numbers with strings, e.g., syllable counts such as '0*'
+    dtype = {h: str for h in get_headers() if h != 'freq'}
+    df = pd.read_csv(filename, dtype=dtype, keep_default_na=False)
+    stem = os.path.splitext(filename)[0]
+
+    if columnar == 'parquet':
+        df.to_parquet(stem + '.parquet')
+
+    elif columnar == 'feather':
+        df.to_feather(stem + '.feather')
+
+    else:
+        raise ValueError('Unknown columnar format: %s' % columnar)
 
 
 def get_headers():
@@ -132,9 +293,9 @@ def get_headers():
         ]
 
 
-def get_gold_row(tok):
+def get_gold_row(tok, annotations):
     '''Return the token's annotations, plus its gold standard details.'''
-    return get_row(tok) + [
+    return get_row(tok, annotations) + [
         # is-gold
         int(tok.is_gold),
 
@@ -148,8 +309,8 @@ def get_gold_row(tok):
         ]
 
 
-def get_row(tok):
-    '''Return the token's annotations.'''
+def get_row(tok, annotations):
+    '''Return the token's annotations, looked up in "annotations".'''
     return ([
         # Aamulehti details (word, freq, pos, msd, lemma)
         encode(tok.orth.lower()),
@@ -159,10 +320,10 @@ def get_row(tok):
         encode(tok.lemma.lower()),
 
         # the lemma's compound split, syllabifications, counts, weights, etc.
-        ] + get_annotations(tok.lemma.lower())
+        ] + annotations[tok.lemma.lower()]
 
         # the word's compound split, syllabifications, counts, weights, etc.
-        + get_annotations(tok.orth.lower())
+        + annotations[tok.orth.lower()]
         )
 
 
@@ -174,8 +335,16 @@ def timestamp():
 
 
 if __name__ == '__main__':
+    # python frame.py [--workers=n] [--resume] [--parquet|--feather]
+    workers = [a.split('=', 1)[1] for a in sys.argv if '--workers=' in a]
+    columnar = [a[2:] for a in sys.argv if a in ('--parquet', '--feather')]
+
     timestamp()
 
-    generate_data_frame()
+    generate_data_frame(
+        workers=int(workers[0]) if workers else None,
+        resume='--resume' in sys.argv,
+        columnar=columnar[0] if columnar else None,
+        )
 
     timestamp()
@@ -4,26 +4,69 @@ import app
 import os
 import re
 
+from collections import namedtuple
 from datetime import datetime
-from sqlalchemy.exc import IntegrityError
+from multiprocessing import Pool
 
 VOWELS = u'ieäyöauo'
 CHARACTERS = u'abcdefghijklmnopqrstuvwxyz-äö'
 PUNCTUATION = r'!"#\$%&\'()\*\+,\./:;<=>\?@\[\\\]\^_`{\|}~'
 
+# split a line by punctuation, spaces, and newline characters
+SPLIT = re.compile(r'(\r\n|[ ]+|[%s]|--)' % PUNCTUATION)
 
-def extract_gutenberg():
-    '''Extract poetry from Project Gutenberg.'''
+# u- and y-final diphthongs (scanned for in whole, lowercase lines)
+DIPHTHONG = re.compile(
+    u'(?=(?:[^aäoöieuy]|^)(au|eu|ou|iu|iy|ey|äy|öy)(?:[^aäoöieuy]|$))')
+
+# words composed of acceptable characters (see CHARACTERS)
+ACCEPTABLE = re.compile(u'[-a-zäö]+$')
+
+GUTENBERG = 'gutenberg/gutenberg'
+
+# the number of rows per executemany INSERT
+BATCH_SIZE = 5000
+
+# lowercase orth -> Token id, preloaded by load_tokens()
+TOKENS = {}
+
+# a book as read, tokenized, and syllabified by a worker process: "sections"
+# are the tokenized section texts, in which each word is the index of a
+# (word, sequences) pair in "words"; "tokens" maps each word not yet in
+# TOKENS to its Token column values
+Extract = namedtuple(
+    'Extract',
+    ['surname', 'title', 'sections', 'words', 'tokens'],
+    )
+
+
+def extract_gutenberg(workers=None):
+    '''Extract poetry from Project Gutenberg.
+
+    Each book is read, tokenized, and syllabified in its own worker process,
+    and then saved in bulk by the parent process, one transaction per book.
+    '''
     # wipe existing Gutenberg tokens prior to extractions
     wipe_gutenberg_tokens()
+    load_tokens()
+
+    # the workers never touch the database, so only the parent writes and
+    # new Tokens cannot be created twice by different books
+    pool = Pool(workers, initializer=app.init_worker)
+
+    for extract in pool.imap(read_book, walk_gutenberg()):
+        save_book(extract)
+
+    pool.close()
+    pool.join()
 
-    # extract Gutenberg poetry
-    for dirpath, dirname, filenames in os.walk('gutenberg/gutenberg'):
+
+def walk_gutenberg():
+    '''Yield the filepath of each book in the corpus.'''
+    for dirpath, dirname, filenames in os.walk(GUTENBERG):
 
         for fn in filenames[1:]:
-            fp = dirpath + '/' + fn
-            Book, text = add_poet_and_book(fn, fp)
-            add_sections(Book, text)
+            yield dirpath + '/' + fn
 
 
 def wipe_gutenberg_tokens():
@@ -32,8 +75,26 @@ def wipe_gutenberg_tokens():
     app.db.session.commit()
 
 
-def add_poet_and_book(fn, fp):
-    '''Add (or retrieve) Poet and Book objects.'''
+def load_tokens():
+    '''Preload TOKENS, a lowercase orth -> id dictionary of all Tokens.'''
+    TOKENS.clear()
+
+    # in Token's default ordering, the first Token per lowercase orth is the
+    # one that find_token() would have returned
+    rows = app.db.session.query(app.Token.orth, app.Token.id).order_by(
+        app.Token.is_gold,
+        app.Token.is_complex,
+        app.Token.freq.desc(),
+        )
+
+    for orth, id in rows:
+        TOKENS.setdefault(orth.lower(), id)
+
+    app.db.session.commit()
+
+
+def parse_book(fp):
+    '''Return the poet's surname, the title, and the text of the book at fp.'''
     with open(fp, 'r') as f:
         f = list(f)
 
@@ -44,42 +105,153 @@ def add_poet_and_book(fn, fp):
         re.sub(r'[^A-Z]\r\n\r\n\r\n', '\r\n\r\n', ''.join(text)),
         ))
 
-    # add or get Poet
     surname = re.search(r'Author:.* ([A-Za-zÄÖäö]+)\n', header).group(1)
-    try:
+    title = re.search(r'Title: (.+)\n', header).group(1)
+
+    return surname.decode('utf-8'), title.decode('utf-8'), text
+
+
+def read_book(fp):
+    '''Read, tokenize, and syllabify the book at fp, as an Extract.'''
+    surname, title, text = parse_book(fp)
+
+    # divide the book into sections and tokenize them
+    words = []
+    sections = [_tokenize_text(s, words) for s in _divide_text(text)]
+
+    # capture the line in which each word appears (see populate_line)
+    for tokenized_text in sections:
+        for i, t in enumerate(tokenized_text):
+            if isinstance(t, int):
+                word, sequences = words[t]
+                line = _get_line(tokenized_text, i, word)
+
+                for vv in sequences:
+                    vv['line'] = line
+
+    # split and syllabify each word that is not already a Token
+    tokens = {}
+
+    for word, sequences in words:
+        if word not in TOKENS and word not in tokens:
+            tokens[word] = _token_row(word)
+
+    return Extract(surname, title, sections, words, tokens)
+
+
+def _token_row(word):
+    # word -> Token column values
+    row = dict(orth=word, is_gutenberg=True)
+    row.update(app.split_values(word))
+    row.update(app.syllabify_values(word))
+
+    return row
+
+
+def save_book(extract):
+    '''Save an Extract's Sections, Tokens, Variants, and VV sequences.
+
+    Rows are inserted in executemany batches with ids drawn up front, and the
+    whole book is committed at once.
+    '''
+    Poet, Book = add_poet_and_book(extract.surname, extract.title)
+
+    # add the Tokens that do not exist yet and flag the ones that do
+    new = sorted(set(w for w, s in extract.words if w not in TOKENS))
+    TOKENS.update(zip(new, reserve_ids(app.Token, len(new))))
+    insert_rows(
+        app.Token,
+        [dict(extract.tokens[w], id=TOKENS[w]) for w in new],
+        )
+
+    existing = set(TOKENS[w] for w, s in extract.words) - set(
+        TOKENS[w] for w in new)
+
+    if existing:
+        app.Token.query.filter(app.Token.id.in_(existing)).update(
+            {app.Token.is_gutenberg: True},
+            synchronize_session=False,
+            )
+
+    # add Sections, with a Variant in place of each word in their texts
+    section_ids = reserve_ids(app.Section, len(extract.sections))
+    variant_ids = reserve_ids(app.Variant, len(extract.words))
+    sections, variants, sequences = [], [], []
+
+    for i, (section_id, text) in enumerate(
+            zip(section_ids, extract.sections),
+            start=1,
+            ):
+        for n, t in enumerate(text):
+            if isinstance(t, int):
+                word, vvs = extract.words[t]
+                variants.append({
+                    'id': variant_ids[t],
+                    'token_id': TOKENS[word],
+                    'section_id': section_id,
+                    })
+                sequences.extend(
+                    dict(
+                        vv,
+                        poet_id=Poet.id,
+                        book_id=Book.id,
+                        variant_id=variant_ids[t],
+                        )
+                    for vv in vvs)
+                text[n] = variant_ids[t]
+
+        sections.append({
+            'id': section_id,
+            'book_id': Book.id,
+            'section': i,
+            'text': text,
+            })
+
+    insert_rows(app.Section, sections)
+    insert_rows(app.Variant, variants)
+    insert_rows(app.VV, sequences)
+    app.db.session.commit()
+
+
+def add_poet_and_book(surname, title):
+    '''Add (or retrieve) Poet and Book objects.'''
+    # add or get Poet
+    Poet = app.Poet.query.filter_by(surname=surname).first()
+
+    if not Poet:
         Poet = app.Poet(surname=surname)
         app.db.session.add(Poet)
-        app.db.session.commit()
-    except IntegrityError:
-        app.db.session.rollback()
-        Poet = app.Poet.query.filter_by(surname=surname).one()
+        app.db.session.flush()
 
     # add Book
-    title = re.search(r'Title: (.+)\n', header).group(1)
     Book = app.Book(title=title, poet_id=Poet.id)
     app.db.session.add(Book)
-    app.db.session.commit()
+    app.db.session.flush()
 
     print '%s (%s)' % (Book.title, Poet.surname)
 
-    return Book, text
+    return Poet, Book
 
 
-def add_sections(Book, text):
-    '''Add Section objects for Book.sections.'''
-    # divide the book into sections
-    sections = _divide_text(text)
+def reserve_ids(model, n):
+    '''Draw n ids from the sequence behind model's primary key.'''
+    if not n:
+        return []
 
-    for i, section_text in enumerate(sections, start=1):
+    rows = app.db.session.execute(
+        "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+        'FROM generate_series(1, :n)',
+        {'table': '"%s"' % model.__tablename__, 'n': n},
+        )
 
-        # add Section
-        Section = app.Section(section=i, book_id=Book.id)
-        app.db.session.add(Section)
-        app.db.session.commit()
+    return [int(id) for id, in rows]
 
-        # tokenize text
-        Section.text = _tokenize_text(section_text, Section)
-        app.db.session.commit()
+
+def insert_rows(model, rows):
+    '''Insert rows (a list of column-value dicts) in executemany batches.'''
+    for i in range(0, len(rows), BATCH_SIZE):
+        batch = rows[i:i + BATCH_SIZE]
+        app.db.session.execute(model.__table__.insert(), batch)
 
 
 def _divide_text(text, n=500):
@@ -109,144 +281,137 @@ def _divide_text(text, n=500):
         return sections
 
 
-def _tokenize_text(section_text, Section, add_objects=True):
-    '''Tokenize text for Section.text'''
+def _tokenize_text(section_text, words=None):
+    '''Tokenize text for Section.text.
+
+    Each word with a u- or y-final diphthong is appended to words as a (word,
+    sequences) pair and is represented in the tokenized text by its index in
+    words (or by None, if words is None).
+    '''
     tokenized_text = []
-    string = ''
 
-    for line in section_text.split('\n'):
+    for t in _tokenize(section_text):
+
+        if isinstance(t, tuple):
+            if words is not None:
+                tokenized_text.append(len(words))
+                words.append(t)
+
+            else:
+                tokenized_text.append(None)
+
+        else:
+            tokenized_text.append(t)
+
+    return tokenized_text
+
+
+def _tokenize(section_text):
+    '''Yield the strings and the (word, sequences) pairs of a section.
+
+    A string is yielded before and after each word (the HTML in between
+    words is buffered and joined only once). Each line is split and scanned
+    for u- and y-final diphthongs only once, and the diphthongs are then
+    matched to the words that contain them.
+    '''
+    strings = []
+    append = strings.append
+
+    for line in section_text.decode('utf-8', 'replace').split(u'\n'):
 
         # if the line is blank, insert an HTML breakpoint
         if not line:
-            string += '<br>'
+            append(u'<br>')
             continue
 
-        string += '<div>'
+        append(u'<div>')
+
+        lower = line.lower()
+        diphthongs = [
+            (m.start(1), m.group(1)) for m in DIPHTHONG.finditer(lower)]
+        d = 0
+        end = 0
 
         # split line by punctuation, spaces, and newline characters:
         # 'päälle pään on taivosehen;' >
         # ['päälle', ' ', 'pään', ' ', 'on', ' ', 'taivosehen', ';']
-        line = filter(None, re.split(
-            r'(\r\n|[ ]+|[%s]|--)' % PUNCTUATION,
-            line,
-            ))
+        for word in SPLIT.split(line):
+            start = end
+            end += len(word)
 
-        for word in line:
-            word = word.decode('utf-8', errors='replace')
+            if not word:
+                continue
 
             # if the word is a series of spaces, insert HTML non-breaking
             # spaces of an equivalent length
-            if len(word) > 1 and word == len(word) * ' ':
-                string += '&nbsp;' * len(word)
+            if word[0] == u' ' and len(word) > 1:
+                append(u'&nbsp;' * len(word))
                 continue
 
             # ignore any words that appear in all uppercase (e.g., acronyms)
             if word == word.upper():
-                string += word
+                append(word)
                 continue
 
-            word = word.lower()
+            word = lower[start:end]
 
             # find all u- and y-final diphthongs in word
-            sequences = _get_u_y_final_diphthongs(word.encode('utf-8'))
-
-            # if the word contains a u- and y-final diphthong and is composed
-            # of acceptable characters...
-            if sequences and all(1 if i in CHARACTERS else 0 for i in word):
-                tokenized_text.append(string)
-                string = ''
+            sequences = []
 
-                if add_objects:
+            while d < len(diphthongs) and diphthongs[d][0] < end:
+                i, vv = diphthongs[d]
+                d += 1
 
-                    # add Variant to db and tokenized_text
-                    Variant = add_variant(word, Section)
-                    tokenized_text.append(Variant.id)
+                if i >= start:
+                    sequences.append((i - start, vv))
 
-                    # add Sequences
-                    add_sequences(sequences, word, Variant)
-
-                else:
-                    tokenized_text.append(None)
+            # if the word contains a u- and y-final diphthong and is composed
+            # of acceptable characters...
+            if sequences and ACCEPTABLE.match(word):
+                yield u''.join(strings)
+                yield word, [_get_sequence(vv, i, word) for i, vv in sequences]
+                del strings[:]
 
             else:
-                string += word
+                append(word)
 
-        string += '</div>'
+        append(u'</div>')
 
-    tokenized_text.append(string)  # WHOOPS
+    yield u''.join(strings)  # WHOOPS
 
-    return tokenized_text
-
-
-def _get_u_y_final_diphthongs(word):
-    '''Extract u- and y-final diphthongs from word.'''
-    pattern = r'(?=([^aäoöieuy]{1}|^)(au|eu|ou|iu|iy|ey|äy|öy)([^aäoöieuy]{1}|$))'  # noqa
-    sequences = list(re.finditer(pattern, word))
 
-    return sequences
+def _get_sequence(vv, i, word):
+    '''Return the VV column values for the sequence vv at word[i].'''
+    # VV.index has always been the index of the sequence in the word's utf-8
+    # encoding (see fix_html_umlaut_bug), so umlauts count twice
+    i += word.count(u'ä', 0, i) + word.count(u'ö', 0, i)
+    is_heavy, is_stressed, split = _get_phonotactics(vv, i, word)
 
+    return dict(
+        sequence=vv,
+        index=i,
+        html=_get_html(vv, i, word),
+        is_heavy=is_heavy,
+        is_stressed=is_stressed,
+        split=split,
+        )
 
-def add_variant(word, Section):
-    '''Add Variant object for Section.variants.'''
-    # find existing Token
-    Token = app.find_token(word)
-
-    # create a new Token if one does not already exist
-    if not Token:
-        Token = app.Token(orth=word)
-        app.db.session.add(Token)
-
-    Token.is_gutenberg = True
-    app.db.session.commit()
 
-    # add Variant
-    Variant = app.Variant(token_id=Token.id, section_id=Section.id)
-    app.db.session.add(Variant)
-    app.db.session.commit()
-
-    return Variant
-
-
-def add_sequences(sequences, word, Variant):
-    '''Add VV objects for Variant.sequences.'''
-    for seq in sequences:
-        i = seq.start(2)
-        is_heavy, is_stressed, split = _get_phonotactics(seq, i, word)
-
-        # add VV
-        VV = app.VV(
-            poet_id=Variant._section._book._poet.id,
-            book_id=Variant._section._book.id,
-            variant_id=Variant.id,
-            sequence=seq.group(2),
-            index=i,
-            html=_get_html(seq, word),
-            is_heavy=is_heavy,
-            is_stressed=is_stressed,
-            split=split,
-            )
-        app.db.session.add(VV)
-
-    app.db.session.commit()
-
-
-def _get_html(sequence, word):
+def _get_html(vv, i, word):
     '''Create the html representation for word, emboldening sequence.'''
-    vv = sequence.group(2).decode('utf-8')
-    i = sequence.start(2)
     j = i + len(vv)
     html = '%s<strong>%s</strong>%s' % (word[:i], vv, word[j:])
 
     return html
 
 
-def _get_phonotactics(sequence, i, word):
+def _get_phonotactics(vv, i, word):
     '''Determine the weight and primary stress of the sequence's syllable.'''
     is_stressed = not any(v in VOWELS for v in word[:i])
     split = 'join' if is_stressed else None
 
     try:
-        is_heavy = word[sequence.end(2) + 1] not in VOWELS
+        is_heavy = word[i + len(vv.encode('utf-8')) + 1] not in VOWELS
     except IndexError:
         is_heavy = word[-1] not in VOWELS
 
@@ -254,28 +419,58 @@ def _get_phonotactics(sequence, i, word):
 
 
 def populate_line():
-    '''Populate VV.line for each VV sequence.'''
-    sequences = app.VV.query.all()
-
-    for VV in sequences:
-        text = VV._variant._section.text
-        index = text.index(VV._variant.id)
-        try:
-            pre = re.split(r'\n|</div>|<div>|<br>', text[index - 1])[-1]
-        except IndexError:
-            pre = ''
-        try:
-            post = re.split(r'\n|</div>|<div>|<br>', text[index + 1])[0]
-        except IndexError:
-            post = ''
-        line = '%s%s%s' % (pre, VV.orth.upper(), post)
-        line = line.replace('&nbsp;', ' ').replace('</strong></span>', '')
-        line = line.replace("<span style='font-size:30px;'><strong><span style='font-size:1px;'>@</span>", '')  # noqa
-        VV.line = line
+    '''Populate VV.line for each VV sequence, one Section at a time.'''
+    # group the VV sequences by Section
+    sequences = {}
+
+    for id, section_id, variant_id, orth in app.db.session.query(
+            app.VV.id,
+            app.Variant.section_id,
+            app.VV.variant_id,
+            app.Token.orth,
+            ).join(app.VV._variant).join(app.Variant._token):
+        sequences.setdefault(section_id, []).append((id, variant_id, orth))
+
+    # unpickle each Section's text once, indexing the positions of its
+    # Variants, and write all of its lines in one executemany UPDATE
+    for section_id, text in app.db.session.query(
+            app.Section.id,
+            app.Section.text,
+            ):
+        if section_id not in sequences:
+            continue
+
+        positions = {}
+
+        for i, t in enumerate(text):
+            if isinstance(t, (int, long)):
+                positions.setdefault(t, i)
+
+        app.bulk_update(app.VV, [
+            {'_id': id, 'line': _get_line(text, positions[variant_id], orth)}
+            for id, variant_id, orth in sequences[section_id]
+            ])
 
     app.db.session.commit()
 
 
+def _get_line(text, index, orth):
+    '''Return the line around the Variant at text[index], with orth in caps.'''
+    try:
+        pre = re.split(r'\n|</div>|<div>|<br>', text[index - 1])[-1]
+    except IndexError:
+        pre = ''
+    try:
+        post = re.split(r'\n|</div>|<div>|<br>', text[index + 1])[0]
+    except IndexError:
+        post = ''
+    line = '%s%s%s' % (pre, orth.upper(), post)
+    line = line.replace('&nbsp;', ' ').replace('</strong></span>', '')
+    line = line.replace("<span style='font-size:30px;'><strong><span style='font-size:1px;'>@</span>", '')  # noqa
+
+    return line
+
+
 def fix_html_umlaut_bug():
     '''Fix VV.html for words where an umlaut precedes VV.sequence.'''
     def replace_umlauts(word, put_back=False):
@@ -308,49 +503,33 @@ def fix_html_umlaut_bug():
 
 def fix_final_text_bug():
     '''Add the missing section-final strings to each section.'''
-    for dirpath, dirname, filenames in os.walk('gutenberg/gutenberg'):
+    for fp in walk_gutenberg():
+        surname, title, text = parse_book(fp)
 
-        for fn in filenames[1:]:
+        # get Poet
+        Poet = app.Poet.query.filter_by(surname=surname).one()
 
-            with open(dirpath + '/' + fn, 'r') as f:
-                f = list(f)
-
-            header, text = f[:4], f[4:]
-            header = ''.join(header).replace('\r', '')
-            text = '\n'.join(re.split(  # too many blank lines...
-                r'\r\n',
-                re.sub(r'[^A-Z]\r\n\r\n\r\n', '\r\n\r\n', ''.join(text)),
-                ))
-
-            # get Poet
-            surname = re.search(
-                r'Author:.* ([A-Za-zÄÖäö]+)\n',
-                header,
-                ).group(1)
-            Poet = app.Poet.query.filter_by(surname=surname).one()
-
-            # get Book and section texts
-            title = re.search(r'Title: (.+)\n', header).group(1)
-            Book = app.Book.query.filter_by(title=title, poet_id=Poet.id).one()
-            sections = _divide_text(text)
-
-            for i, section_text in enumerate(sections, start=1):
-
-                # get Section
-                Section = app.Section.query.filter_by(
-                    section=i,
-                    book_id=Book.id,
-                    ).one()
-
-                # extract and save final the section-final text string
-                tokenized_text = _tokenize_text(section_text, Section, False)
-                final_text = tokenized_text[-1]
-
-                if final_text and len(Section.text) != len(tokenized_text):
-                    text = Section.text + [final_text, ]
-                    Section.text = text
-
-            app.db.session.commit()
+        # get Book and section texts
+        Book = app.Book.query.filter_by(title=title, poet_id=Poet.id).one()
+        sections = _divide_text(text)
+
+        for i, section_text in enumerate(sections, start=1):
+
+            # get Section
+            Section = app.Section.query.filter_by(
+                section=i,
+                book_id=Book.id,
+                ).one()
+
+            # extract and save final the section-final text string
+            tokenized_text = _tokenize_text(section_text)
+            final_text = tokenized_text[-1]
+
+            if final_text and len(Section.text) != len(tokenized_text):
+                text = Section.text + [final_text, ]
+                Section.text = text
+
+        app.db.session.commit()
 
 
 if __name__ == '__main__':
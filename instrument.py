@@ -0,0 +1,364 @@
+# coding=utf-8
+
+import json
+import logging
+import os
+import sys
+import thread
+import threading
+
+from collections import Counter, deque, OrderedDict
+from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from functools import wraps
+from heapq import heappush, heapreplace
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import event
+from time import sleep, time
+
+from syllabifier import Syllabifier
+
+# Opt-in request instrumentation: set INSTRUMENT = True in config.py to record
+# each request's wall time, its SQL statements and their duration, the ORM
+# objects it loaded, and the time it spent in FinnSyll. The records are
+# written to a rotating log and kept in memory for the /instrumentation view.
+#
+# Setting INSTRUMENT_PROFILE = True also samples the stack of each request
+# and dumps the samples of the slowest requests in the collapsed format that
+# flamegraph.pl and speedscope read. (Under uWSGI, this needs enable-threads.)
+
+DEFAULTS = {
+    'INSTRUMENT_LOG': 'records/requests.log',
+    'INSTRUMENT_LOG_BYTES': 2 ** 20,
+    'INSTRUMENT_LOG_BACKUPS': 5,
+    'INSTRUMENT_PROFILE': False,
+    'INSTRUMENT_PROFILE_DIR': 'records/profiles',
+    'INSTRUMENT_PROFILE_INTERVAL': 0.005,  # seconds between samples
+    'INSTRUMENT_PROFILE_SLOWEST': 10,  # the number of profiles kept
+    }
+
+# the number of recent requests kept in memory (by each process)
+RECENT_SIZE = 500
+
+RECENT = deque(maxlen=RECENT_SIZE)
+
+# endpoint -> the totals of its requests
+ENDPOINTS = {}
+
+LOCK = threading.Lock()
+
+# thread id -> a Counter of the collapsed stacks sampled from the request
+# that the thread is serving
+ACTIVE = {}
+
+# a min-heap of (wall time, filename) for the profiles of the slowest requests
+SLOWEST = []
+
+# the id of the process in which the sampler thread runs, if any
+SAMPLER = {}
+
+log = logging.getLogger('finnsyll.requests')
+
+
+def init_app(app, db):
+    '''Instrument app's requests, db's queries and models, and FinnSyll.'''
+    for key, value in DEFAULTS.iteritems():
+        app.config.setdefault(key, value)
+
+    # write one JSON object per request to a rotating log
+    filename = app.config['INSTRUMENT_LOG']
+    directory = os.path.dirname(filename)
+
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    handler = RotatingFileHandler(
+        filename,
+        maxBytes=app.config['INSTRUMENT_LOG_BYTES'],
+        backupCount=app.config['INSTRUMENT_LOG_BACKUPS'],
+        )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(db.engine, 'handle_error', handle_error)
+    event.listen(db.Model, 'load', count_object, propagate=True)
+
+    # syllabify(), split(), and annotate() all go through _cached()
+    Syllabifier._cached = timed(Syllabifier._cached)
+
+    # requests are recorded on teardown, which (unlike after_request) also
+    # runs when a view raises
+    app.before_request(start_request)
+    app.after_request(note_response)
+    app.teardown_request(finish_request)
+
+
+def get_metrics():
+    '''Return the metrics of the current request, if any.'''
+    if has_request_context():
+        return getattr(g, 'instrument', None)
+
+
+# Recording -------------------------------------------------------------------
+
+def start_request():
+    if request.endpoint == 'static':
+        return
+
+    g.instrument = {
+        'started': time(),
+        'sql_count': 0,
+        'sql_time': 0.0,
+        'orm_objects': 0,
+        'finnsyll_calls': 0,
+        'finnsyll_time': 0.0,
+        'depth': 0,
+        }
+
+    if current_app.config['INSTRUMENT_PROFILE']:
+        start_sampler(current_app.config['INSTRUMENT_PROFILE_INTERVAL'])
+        ACTIVE[thread.get_ident()] = Counter()
+
+
+def note_response(response):
+    metrics = get_metrics()
+
+    if metrics is not None:
+        metrics['status'] = response.status_code
+
+    return response
+
+
+def finish_request(exception=None):
+    metrics = get_metrics()
+    stacks = ACTIVE.pop(thread.get_ident(), None)
+
+    if metrics is None:
+        return
+
+    # a view that raised is answered with a 500, without an after_request
+    status = 500 if exception is not None else metrics.get('status')
+
+    record = OrderedDict([
+        ('time', datetime.utcnow().isoformat()),
+        ('pid', os.getpid()),
+        ('method', request.method),
+        ('path', request.path),
+        ('endpoint', request.endpoint),
+        ('status', status),
+        ('wall_ms', ms(time() - metrics['started'])),
+        ('sql_count', metrics['sql_count']),
+        ('sql_ms', ms(metrics['sql_time'])),
+        ('orm_objects', metrics['orm_objects']),
+        ('finnsyll_calls', metrics['finnsyll_calls']),
+        ('finnsyll_ms', ms(metrics['finnsyll_time'])),
+        ])
+
+    if exception is not None:
+        record['error'] = repr(exception)
+
+    with LOCK:
+        profile = keep_profile(record, stacks) if stacks else None
+
+        if profile:
+            record['profile'] = profile
+
+        RECENT.append(record)
+        add_totals(record)
+
+    log.info(json.dumps(record))
+
+
+def before_cursor_execute(conn, cursor, statement, params, context, many):
+    conn.info.setdefault('instrument_started', []).append(time())
+
+
+def after_cursor_execute(conn, cursor, statement, params, context, many):
+    count_statement(conn.info['instrument_started'].pop())
+
+
+def handle_error(context):
+    # a statement that raised is never followed by after_cursor_execute, so
+    # it is counted (and its start time cleared) here
+    if context.connection is None:
+        return
+
+    started = context.connection.info.get('instrument_started')
+
+    if started:
+        count_statement(started.pop())
+        del started[:]
+
+
+def count_statement(started):
+    metrics = get_metrics()
+
+    if metrics is not None:
+        metrics['sql_count'] += 1
+        metrics['sql_time'] += time() - started
+
+
+def count_object(target, context):
+    metrics = get_metrics()
+
+    if metrics is not None:
+        metrics['orm_objects'] += 1
+
+
+def timed(method):
+    '''Time calls to the Syllabifier method "method".
+
+    Only the outermost call is timed, since FinnSyll's methods call one
+    another.
+    '''
+    @wraps(method)
+    def wrapper(self, name, word):
+        metrics = get_metrics()
+
+        if metrics is None or metrics['depth']:
+            return method(self, name, word)
+
+        metrics['depth'] += 1
+        started = time()
+
+        try:
+            return method(self, name, word)
+
+        finally:
+            metrics['depth'] -= 1
+            metrics['finnsyll_calls'] += 1
+            metrics['finnsyll_time'] += time() - started
+
+    return wrapper
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+# Reporting -------------------------------------------------------------------
+
+TOTALS = ['wall_ms', 'sql_count', 'sql_ms', 'orm_objects', 'finnsyll_ms']
+
+
+def add_totals(record):
+    totals = ENDPOINTS.setdefault(
+        record['endpoint'],
+        dict({t: 0 for t in TOTALS}, count=0, max_wall_ms=0),
+        )
+    totals['count'] += 1
+    totals['max_wall_ms'] = max(totals['max_wall_ms'], record['wall_ms'])
+
+    for t in TOTALS:
+        totals[t] += record[t]
+
+
+def summary(n=50):
+    '''Return the per-endpoint means and the n most recent requests.
+
+    Only the requests served by this process are included; see the log for
+    the requests of every process.
+    '''
+    with LOCK:
+        endpoints = {}
+
+        for endpoint, totals in ENDPOINTS.iteritems():
+            means = {'mean_' + t: round(float(totals[t]) / totals['count'], 2)
+                     for t in TOTALS}
+            means['count'] = totals['count']
+            means['max_wall_ms'] = totals['max_wall_ms']
+            endpoints[endpoint] = means
+
+        return {
+            'pid': os.getpid(),
+            'endpoints': endpoints,
+            'recent': list(RECENT)[-n:][::-1] if n > 0 else [],
+            'profiles': [f for wall, f in sorted(SLOWEST, reverse=True)],
+            }
+
+
+# Sampling profiler -----------------------------------------------------------
+
+def start_sampler(interval):
+    '''Start the sampler thread, once per process.'''
+    if SAMPLER.get('pid') == os.getpid():
+        return
+
+    SAMPLER['pid'] = os.getpid()
+    sampler = threading.Thread(target=sample, args=(interval, ))
+    sampler.daemon = True
+    sampler.start()
+
+
+def sample(interval):
+    '''Every interval seconds, sample the stack of each active request.'''
+    while True:
+        frames = sys._current_frames()
+
+        for ident, stacks in ACTIVE.items():
+            frame = frames.get(ident)
+
+            if frame is not None:
+                stacks[collapse(frame)] += 1
+
+        sleep(interval)
+
+
+def collapse(frame):
+    '''Return the stack of frame as "module:function;..." from the root.'''
+    names = []
+
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append('%s:%s' % (module, code.co_name))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+def keep_profile(record, stacks):
+    '''Dump stacks if record is among the slowest requests.
+
+    Return the profile's filename, or None if the request was not slow enough
+    to keep. The profile that it displaces, if any, is deleted.
+    '''
+    config = current_app.config
+    wall = record['wall_ms']
+
+    if len(SLOWEST) >= config['INSTRUMENT_PROFILE_SLOWEST'] and \
+            wall <= SLOWEST[0][0]:
+        return None
+
+    directory = config['INSTRUMENT_PROFILE_DIR']
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    filename = os.path.join(directory, '%s-%s-%s.folded' % (
+        record['endpoint'],
+        record['time'].replace(':', ''),
+        record['pid'],
+        ))
+
+    with open(filename, 'w') as f:
+        for stack, count in stacks.items():
+            f.write('%s %s\n' % (stack, count))
+
+    if len(SLOWEST) >= config['INSTRUMENT_PROFILE_SLOWEST']:
+        _, displaced = heapreplace(SLOWEST, (wall, filename))
+
+        try:
+            os.remove(displaced)
+
+        except OSError:
+            pass
+
+    else:
+        heappush(SLOWEST, (wall, filename))
+
+    return filename
@@ -0,0 +1,43 @@
+"""empty message
+
+Revision ID: 2f6b8d31c0ae
+Revises: 5c2a9e4f1d7b
+Create Date: 2026-10-16 14:37:05.862714
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f6b8d31c0ae'
+down_revision = '5c2a9e4f1d7b'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.add_column('Token', sa.Column('rule_set', postgresql.ARRAY(sa.Text()), nullable=True))
+
+    # populate rule_set from rules1-16
+    op.execute(
+        'UPDATE "Token" SET rule_set = ARRAY('
+        "SELECT DISTINCT m[1] FROM regexp_matches(concat_ws(' ', %s), "
+        "'T[a-z0-9]+', 'g') AS m ORDER BY 1)"
+        % ', '.join('rules%i' % n for n in range(1, 17))
+        )
+
+    op.create_index('ix_Token_rule_set', 'Token', ['rule_set'], unique=False, postgresql_using='gin')
+
+    # perform_search's exact, contains, and word-boundary searches
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX "ix_Token_lower_orth" ON "Token" (lower(orth))')
+    op.execute('CREATE INDEX "ix_Token_orth_trgm" ON "Token" USING gin (orth gin_trgm_ops)')
+    op.execute('CREATE INDEX "ix_Token_gold_base_trgm" ON "Token" USING gin (gold_base gin_trgm_ops)')
+
+
+def downgrade():
+    op.drop_index('ix_Token_gold_base_trgm', 'Token')
+    op.drop_index('ix_Token_orth_trgm', 'Token')
+    op.drop_index('ix_Token_lower_orth', 'Token')
+    op.drop_index('ix_Token_rule_set', 'Token')
+    op.drop_column('Token', 'rule_set')
@@ -0,0 +1,23 @@
+"""empty message
+
+Revision ID: 3f8b1d6e9a27
+Revises: 8a4d2c7e5b19
+Create Date: 2026-10-16 12:04:47.193382
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f8b1d6e9a27'
+down_revision = '8a4d2c7e5b19'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('Document', sa.Column('rendered_version', sa.Integer(), nullable=True))
+    op.execute('UPDATE "Document" SET rendered_version = 0')
+
+
+def downgrade():
+    op.drop_column('Document', 'rendered_version')
@@ -0,0 +1,32 @@
+"""empty message
+
+Revision ID: 6e1f4a9c2d83
+Revises: b8d3e6a2c419
+Create Date: 2026-10-17 03:12:40.518207
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '6e1f4a9c2d83'
+down_revision = 'b8d3e6a2c419'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('Document', sa.Column('unverified_count', sa.Integer(), nullable=True))
+
+    # count each document's unique unverified tokens
+    op.execute('UPDATE "Document" SET unverified_count = 0')
+    op.execute(
+        'UPDATE "Document" SET unverified_count = c.n '
+        'FROM (SELECT dt.document_id, count(DISTINCT dt.token_id) AS n '
+        'FROM "DocumentToken" dt JOIN "Token" t ON t.id = dt.token_id '
+        'WHERE t.is_gold IS NULL GROUP BY dt.document_id) AS c '
+        'WHERE c.document_id = "Document".id'
+        )
+
+
+def downgrade():
+    op.drop_column('Document', 'unverified_count')
@@ -0,0 +1,63 @@
+"""empty message
+
+Revision ID: 7d41c9b2e85f
+Revises: 2f6b8d31c0ae
+Create Date: 2026-10-16 23:02:41.508317
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d41c9b2e85f'
+down_revision = '2f6b8d31c0ae'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+SLOTS = ['test_syll', 'rules', 'syll']
+
+
+def array(attr):
+    return 'ARRAY[%s]' % ', '.join('%s%i' % (attr, n) for n in range(1, 17))
+
+
+def upgrade():
+    for attr in SLOTS:
+        op.add_column('Token', sa.Column(attr, postgresql.ARRAY(sa.Text()), nullable=True))
+
+    # collapse syll1-16 and test_syll1-16 into arrays without empty strings;
+    # rules1-16 are truncated to the length of test_syll, so that the two
+    # arrays stay aligned
+    op.execute(
+        'UPDATE "Token" SET '
+        "test_syll = array_remove(array_remove(%s, NULL), ''), "
+        "syll = array_remove(array_remove(%s, NULL), '')"
+        % (array('test_syll'), array('syll'))
+        )
+    op.execute(
+        'UPDATE "Token" SET '
+        'rules = (%s)[1:coalesce(array_length(test_syll, 1), 0)]'
+        % array('rules')
+        )
+
+    for attr in SLOTS:
+        for n in range(1, 17):
+            op.drop_column('Token', '%s%i' % (attr, n))
+
+
+def downgrade():
+    for attr in SLOTS:
+        for n in range(1, 17):
+            op.add_column('Token', sa.Column('%s%i' % (attr, n), sa.VARCHAR(length=80), nullable=True))
+
+    op.execute(
+        'UPDATE "Token" SET %s' % ', '.join(
+            "%s%i = coalesce(%s[%i], '')" % (attr, n, attr, n)
+            for attr in SLOTS
+            for n in range(1, 17)
+            )
+        )
+
+    for attr in SLOTS:
+        op.drop_column('Token', attr)
@@ -0,0 +1,36 @@
+"""empty message
+
+Revision ID: 8a4d2c7e5b19
+Revises: 6e1f4a9c2d83
+Create Date: 2026-10-17 11:32:05.264718
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8a4d2c7e5b19'
+down_revision = '6e1f4a9c2d83'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # the /bad listing's keys now place null is_bad_splits last and null
+    # notes first, as its original ORDER BY did
+    op.drop_index('ix_Token_bad', 'Token')
+    op.execute(
+        'CREATE INDEX "ix_Token_bad" ON "Token" '
+        "((NOT coalesce(gold_base <> test_base, true)), "
+        "((gold_base <> test_base) IS NOT NULL), "
+        "(note IS NULL), (coalesce(note, '')), id) "
+        'WHERE is_gold = false'
+        )
+
+
+def downgrade():
+    op.drop_index('ix_Token_bad', 'Token')
+    op.execute(
+        'CREATE INDEX "ix_Token_bad" ON "Token" '
+        "((NOT coalesce(gold_base <> test_base, true)), (coalesce(note, '')), id) "
+        'WHERE is_gold = false'
+        )
@@ -0,0 +1,107 @@
+"""empty message
+
+Revision ID: a3c85e1f9d42
+Revises: 7d41c9b2e85f
+Create Date: 2026-10-16 23:41:12.093851
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a3c85e1f9d42'
+down_revision = '7d41c9b2e85f'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import column, table
+
+
+BATCH_SIZE = 50000
+
+document = table(
+    'Document',
+    column('id', sa.Integer),
+    column('tokenized_text', sa.PickleType),
+    column('tokens', sa.PickleType),
+    )
+
+document_token = table(
+    'DocumentToken',
+    column('document_id', sa.Integer),
+    column('position', sa.Integer),
+    column('token_id', sa.Integer),
+    column('string', sa.Text),
+    )
+
+
+def upgrade():
+    op.create_table('DocumentToken',
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('token_id', sa.Integer(), nullable=True),
+    sa.Column('string', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['Document.id'], ),
+    sa.ForeignKeyConstraint(['token_id'], ['Token.id'], ),
+    sa.PrimaryKeyConstraint('document_id', 'position')
+    )
+    op.add_column('Document', sa.Column('rendered', sa.Text(), nullable=True))
+
+    # unpickle each Document's tokenized_text into DocumentToken rows
+    conn = op.get_bind()
+    rows = []
+
+    for doc_id, tokenized_text in conn.execute(
+            sa.select([document.c.id, document.c.tokenized_text])):
+
+        for position, t in enumerate(tokenized_text or []):
+            is_token = isinstance(t, (int, long))
+            rows.append({
+                'document_id': doc_id,
+                'position': position,
+                'token_id': t if is_token else None,
+                'string': None if is_token else t,
+                })
+
+        if len(rows) >= BATCH_SIZE:
+            conn.execute(document_token.insert(), rows)
+            rows = []
+
+    if rows:
+        conn.execute(document_token.insert(), rows)
+
+    op.create_index(op.f('ix_DocumentToken_token_id'), 'DocumentToken', ['token_id'], unique=False)
+
+    op.drop_column('Document', 'tokenized_text')
+    op.drop_column('Document', 'tokens')
+
+
+def downgrade():
+    op.add_column('Document', sa.Column('tokens', sa.PickleType(), nullable=True))
+    op.add_column('Document', sa.Column('tokenized_text', sa.PickleType(), nullable=True))
+
+    # re-pickle each Document's positions
+    conn = op.get_bind()
+    texts = {}
+
+    for doc_id, token_id, string in conn.execute(
+            sa.select([
+                document_token.c.document_id,
+                document_token.c.token_id,
+                document_token.c.string,
+                ]).order_by(
+                document_token.c.document_id,
+                document_token.c.position,
+                )):
+        texts.setdefault(doc_id, []).append(
+            string if token_id is None else token_id)
+
+    for doc_id, tokenized_text in texts.iteritems():
+        conn.execute(
+            document.update().where(document.c.id == doc_id).values(
+                tokenized_text=tokenized_text,
+                tokens=list(set(t for t in tokenized_text
+                                if isinstance(t, (int, long)))),
+                ))
+
+    op.drop_index(op.f('ix_DocumentToken_token_id'), table_name='DocumentToken')
+    op.drop_column('Document', 'rendered')
+    op.drop_table('DocumentToken')
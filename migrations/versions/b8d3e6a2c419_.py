@@ -0,0 +1,40 @@
+"""empty message
+
+Revision ID: b8d3e6a2c419
+Revises: e5a1f0c3b872
+Create Date: 2026-10-17 01:48:53.170442
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3e6a2c419'
+down_revision = 'e5a1f0c3b872'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('Variant', sa.Column('verified', sa.Boolean(), nullable=True))
+
+    # a variant is verified if all of its sequences are
+    op.execute(
+        'UPDATE "Variant" SET verified = NOT EXISTS ('
+        'SELECT 1 FROM "VV" WHERE "VV".variant_id = "Variant".id '
+        'AND NOT coalesce("VV".verified, false))'
+        )
+
+    # recompute the sections' statuses from their variants
+    op.execute(
+        'UPDATE "Section" SET status = CASE '
+        "WHEN v.all_verified THEN 'complete'::status "
+        "ELSE 'in-progress'::status END "
+        'FROM (SELECT section_id, bool_or(verified) AS any_verified, '
+        'bool_and(verified) AS all_verified '
+        'FROM "Variant" GROUP BY section_id) AS v '
+        'WHERE v.section_id = "Section".id AND v.any_verified'
+        )
+
+
+def downgrade():
+    op.drop_column('Variant', 'verified')
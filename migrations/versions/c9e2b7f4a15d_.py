@@ -0,0 +1,33 @@
+"""empty message
+
+Revision ID: c9e2b7f4a15d
+Revises: a3c85e1f9d42
+Create Date: 2026-10-17 00:12:48.331906
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c9e2b7f4a15d'
+down_revision = 'a3c85e1f9d42'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # the sort keys of token_view's /bad and /notes listings, which paginate
+    # by seeking along them
+    op.execute(
+        'CREATE INDEX "ix_Token_bad" ON "Token" '
+        "((NOT coalesce(gold_base <> test_base, true)), (coalesce(note, '')), id) "
+        'WHERE is_gold = false'
+        )
+    op.execute(
+        'CREATE INDEX "ix_Token_notes" ON "Token" (note, id) '
+        "WHERE is_gold IS NOT NULL AND note <> ''"
+        )
+
+
+def downgrade():
+    op.drop_index('ix_Token_notes', 'Token')
+    op.drop_index('ix_Token_bad', 'Token')
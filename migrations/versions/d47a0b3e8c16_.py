@@ -0,0 +1,25 @@
+"""empty message
+
+Revision ID: d47a0b3e8c16
+Revises: 9b6e2f0c4d58
+Create Date: 2026-10-16 13:27:52.881954
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd47a0b3e8c16'
+down_revision = '9b6e2f0c4d58'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('Job', sa.Column('updated', sa.DateTime(), nullable=True))
+
+    # a running job's last heartbeat is, at the latest, when it started
+    op.execute('UPDATE "Job" SET updated = started')
+
+
+def downgrade():
+    op.drop_column('Job', 'updated')
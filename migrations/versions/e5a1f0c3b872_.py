@@ -0,0 +1,35 @@
+"""empty message
+
+Revision ID: e5a1f0c3b872
+Revises: c9e2b7f4a15d
+Create Date: 2026-10-17 01:05:27.640215
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1f0c3b872'
+down_revision = 'c9e2b7f4a15d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('Job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=40), nullable=False),
+    sa.Column('args', sa.PickleType(), nullable=True),
+    sa.Column('status', sa.Enum(u'queued', u'running', u'complete', u'failed', name='job_status'), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.Column('started', sa.DateTime(), nullable=True),
+    sa.Column('finished', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_Job_status'), 'Job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Job_status'), table_name='Job')
+    op.drop_table('Job')
+    sa.Enum(name='job_status').drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,365 @@
+# coding=utf-8
+
+import json
+import mmap
+import numpy as np
+import os
+import sys
+
+from collections import namedtuple
+from datetime import datetime
+
+# A snapshot is a compact, memory-mappable copy of the verified Tokens, for
+# evaluations and analyses that don't need to query the database. The file is
+# laid out as follows:
+#
+#   MAGIC
+#   the header's length (a little-endian uint32)
+#   the header, as json: the format version, row count, and the dtype and
+#       offset of each section (relative to the end of the header)
+#   the string table's offsets (uint32), then its utf-8 encoded strings
+#   one array per column: indices into the string table for text columns,
+#       int8 (-1 for None) for boolean columns, and int32 for integer columns
+#
+# Every distinct string is stored once, and each section is aligned to eight
+# bytes, so that columns can be mapped straight into numpy arrays.
+
+MAGIC = 'FSGOLD\x00\x00'
+
+# bump whenever the layout or the columns change
+VERSION = 1
+
+FILENAME = 'records/gold.snapshot'
+
+TEXT, BOOL, INT = 'text', 'bool', 'int'
+
+COLUMNS = [
+    ('id', INT),
+    ('orth', TEXT),
+    ('lemma', TEXT),
+    ('pos', TEXT),
+    ('msd', TEXT),
+    ('freq', INT),
+    ('gold_base', TEXT),
+    ('test_base', TEXT),
+    ('note', TEXT),
+    ('is_aamulehti', BOOL),
+    ('is_gold', BOOL),
+    ('is_complex', BOOL),
+    ('is_loanword', BOOL),
+    ]
+COLUMNS += [('syll%i' % n, TEXT) for n in range(1, 17)]
+COLUMNS += [('test_syll%i' % n, TEXT) for n in range(1, 17)]
+COLUMNS += [('rules%i' % n, TEXT) for n in range(1, 17)]
+
+DTYPES = {TEXT: '<u4', BOOL: '<i1', INT: '<i4'}
+
+# the columns of a gold token needed to re-evaluate it outside of the ORM
+Gold = namedtuple('Gold', [
+    'orth',
+    'lemma',
+    'is_gold',
+    'is_complex',
+    'gold_base',
+    'test_base',
+    'sylls',        # syll1-16
+    'test_sylls',   # test_syll1-16
+    'rules',        # rules1-16
+    ])
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# Reading ---------------------------------------------------------------------
+
+class Snapshot(object):
+    '''A read-only, memory-mapped gold set snapshot.'''
+
+    def __init__(self, filename=FILENAME):
+        self.filename = filename
+
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise SnapshotError('%s is not a gold set snapshot.' % filename)
+
+        start = len(MAGIC) + 4
+        length = np.frombuffer(self._mmap, '<u4', 1, len(MAGIC))[0]
+        self.header = json.loads(self._mmap[start:start + length])
+
+        # section offsets are relative to the end of the header
+        self._base = start + length
+
+        if self.header['version'] != VERSION:
+            raise SnapshotError('%s is a version %s snapshot; expected %s.' % (
+                filename, self.header['version'], VERSION))
+
+        self.count = self.header['count']
+        self.created = self.header['created']
+        self.types = dict(COLUMNS)
+        self.columns = {
+            name: self._array(section)
+            for name, section in self.header['columns'].iteritems()
+            }
+
+        # the string table
+        self._offsets = self._array(self.header['offsets'])
+        self._data = self._base + self.header['strings']['offset']
+        self._strings = {}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in xrange(self.count):
+            yield Row(self, i)
+
+    def __getitem__(self, i):
+        if not -self.count <= i < self.count:
+            raise IndexError(i)
+
+        return Row(self, i % self.count)
+
+    def _array(self, section):
+        return np.frombuffer(
+            self._mmap,
+            section['dtype'],
+            section['count'],
+            self._base + section['offset'],
+            )
+
+    def string(self, i):
+        '''Return the i-th string in the string table (interned).'''
+        try:
+            return self._strings[i]
+
+        except KeyError:
+            # index 0 is reserved for None
+            if i == 0:
+                return None
+
+            start = self._data + self._offsets[i - 1]
+            end = self._data + self._offsets[i]
+            s = self._mmap[start:end].decode('utf-8')
+            self._strings[i] = s
+
+            return s
+
+    def value(self, column, i):
+        '''Return the value of column for the i-th row.'''
+        value = self.columns[column][i]
+        kind = self.types[column]
+
+        if kind == TEXT:
+            return self.string(value)
+
+        if kind == BOOL:
+            return None if value == -1 else bool(value)
+
+        return int(value)
+
+    def column(self, column):
+        '''Return every value of column as a list.'''
+        return [self.value(column, i) for i in xrange(self.count)]
+
+    def gold(self):
+        '''Return a list of Gold tuples, e.g., for eval.Test.'''
+        gold = []
+        slots = lambda attr, i: tuple(
+            self.value(attr + str(n), i) for n in range(1, 17))
+
+        for i in xrange(self.count):
+            gold.append(Gold(
+                self.value('orth', i),
+                self.value('lemma', i),
+                self.value('is_gold', i),
+                self.value('is_complex', i),
+                self.value('gold_base', i),
+                self.value('test_base', i),
+                slots('syll', i),
+                slots('test_syll', i),
+                slots('rules', i),
+                ))
+
+        return gold
+
+
+class Row(object):
+    '''A row of a Snapshot, exposing its columns as Token-like attributes.'''
+
+    __slots__ = ['_snapshot', '_i']
+
+    def __init__(self, snapshot, i):
+        self._snapshot = snapshot
+        self._i = i
+
+    def __getattr__(self, attr):
+        try:
+            return self._snapshot.value(attr, self._i)
+
+        except KeyError:
+            raise AttributeError(attr)
+
+    def __repr__(self):
+        return self.orth
+
+
+def load(filename=FILENAME):
+    '''Load the gold set snapshot saved at filename.'''
+    return Snapshot(filename)
+
+
+# Writing ---------------------------------------------------------------------
+
+def gold_order():
+    '''Return the ORDER BY clauses of the gold set.
+
+    This is Token's default ordering, with ties broken by id, so that a
+    snapshot lists the gold set as eval.gold_snapshot() reads it.
+    '''
+    from app import Token
+
+    return [Token.is_gold, Token.is_complex, Token.freq.desc(), Token.id]
+
+
+def export(filename=FILENAME, tokens=None):
+    '''Write the verified Tokens (or the Tokens in "tokens") to filename.'''
+    from app import get_gold_tokens, Token
+
+    tokens = get_gold_tokens() if tokens is None else tokens
+    names = [name for name, kind in COLUMNS]
+    rows = tokens.with_entities(*[getattr(Token, n) for n in names]) \
+        .order_by(None) \
+        .order_by(*gold_order())
+    rows = [tuple(row) for row in rows.yield_per(10000)]
+
+    write(filename, rows)
+
+    return len(rows)
+
+
+def write(filename, rows):
+    '''Write rows (tuples ordered as COLUMNS) to filename as a snapshot.'''
+    strings = {None: 0}
+    table = []
+    columns = {}
+
+    def intern(s):
+        try:
+            return strings[s]
+
+        except KeyError:
+            strings[s] = len(table) + 1
+            table.append(s.encode('utf-8') if isinstance(s, unicode) else s)
+
+            return strings[s]
+
+    for j, (name, kind) in enumerate(COLUMNS):
+        values = [row[j] for row in rows]
+
+        if kind == TEXT:
+            values = [intern(v) for v in values]
+
+        elif kind == BOOL:
+            values = [-1 if v is None else int(v) for v in values]
+
+        else:
+            values = [v or 0 for v in values]
+
+        columns[name] = np.array(values, dtype=DTYPES[kind])
+
+    offsets = np.cumsum([0] + [len(s) for s in table], dtype='<u4')
+    data = ''.join(table)
+
+    # lay out the sections after the header, which is padded to a multiple of
+    # eight bytes once its final length is known
+    sections = [('offsets', offsets)]
+    sections += [(name, columns[name]) for name, kind in COLUMNS]
+
+    header = {
+        'version': VERSION,
+        'count': len(rows),
+        'created': str(datetime.utcnow()),
+        'columns': {},
+        }
+    body = []
+    position = 0
+
+    for name, array in sections:
+        section = {
+            'dtype': array.dtype.str,
+            'count': len(array),
+            'offset': position,
+            }
+
+        if name == 'offsets':
+            header['offsets'] = section
+
+        else:
+            header['columns'][name] = section
+
+        body.append(_pad(array.tostring()))
+        position += len(body[-1])
+
+    header['strings'] = {'offset': position, 'length': len(data)}
+    body.append(data)
+
+    # pad the header so that the sections that follow it stay aligned
+    start = len(MAGIC) + 4
+    encoded = json.dumps(header)
+    encoded += ' ' * (_aligned(start + len(encoded)) - start - len(encoded))
+
+    # write to a temporary file first, so that readers never see a partially
+    # written snapshot
+    directory = os.path.dirname(filename)
+
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([len(encoded)], dtype='<u4').tostring())
+        f.write(encoded)
+
+        for chunk in body:
+            f.write(chunk)
+
+    os.rename(filename + '.tmp', filename)
+
+
+def _aligned(n, alignment=8):
+    return n + (-n % alignment)
+
+
+def _pad(s, alignment=8):
+    return s + '\x00' * (-len(s) % alignment)
+
+
+# -----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    # python snapshot.py export [filename]
+    # python snapshot.py info [filename]
+    try:
+        command = sys.argv[1]
+        filename = sys.argv[2] if len(sys.argv) > 2 else FILENAME
+
+    except IndexError:
+        command = None
+
+    if command == 'export':
+        print '%s tokens exported to %s' % (export(filename), filename)
+
+    elif command == 'info':
+        snapshot = load(filename)
+        print '%s tokens (version %s, created %s)' % (
+            len(snapshot),
+            snapshot.header['version'],
+            snapshot.created,
+            )
+
+    else:
+        print 'Usage: python snapshot.py (export|info) [filename]'
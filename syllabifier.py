@@ -1,5 +1,13 @@
 # coding=utf-8
 
+import atexit
+import cPickle as pickle
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from collections import OrderedDict
 from os import sys, path
 
 # import local finnsyll project with unreleased developments;
@@ -7,8 +15,228 @@ from os import sys, path
 projects = path.dirname(path.dirname(path.abspath(__file__)))
 sys.path = [path.join(projects, 'finnsyll'), ] + sys.path
 
-from finnsyll import FinnSyll, phonology as phon  # noqa
+import finnsyll  # noqa
+
+from finnsyll import phonology as phon  # noqa
+
+# if set, the directory in which syllabification caches persist across runs
+CACHE_DIR = os.environ.get('FINNSYLL_CACHE')
+
+# the maximum number of words each cache holds before evicting the least
+# recently used word
+CACHE_SIZE = int(os.environ.get('FINNSYLL_CACHE_SIZE', 2 ** 17))
+
+
+# Caching ---------------------------------------------------------------------
+
+class Cache(object):
+    '''A bounded least-recently-used cache with hit and miss counters.'''
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, compute):
+        '''Return the cached value for key, computing it if it is missing.'''
+        try:
+            value = self.data.pop(key)
+            self.hits += 1
+
+        except KeyError:
+            value = compute(key)
+            self.misses += 1
+
+            if len(self.data) >= self.maxsize:
+                self.data.popitem(last=False)
+
+        # (re)insert the key as the most recently used
+        self.data[key] = value
+
+        return value
+
+    def find(self, key):
+        '''Return the cached value for key, or None if it is missing.'''
+        try:
+            value = self.data.pop(key)
+
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.data[key] = value
+
+        return value
+
+    def put(self, key, value):
+        '''Cache value for key.'''
+        if self.data.pop(key, None) is None and len(self.data) >= self.maxsize:
+            self.data.popitem(last=False)
+
+        self.data[key] = value
+
+    def update(self, data):
+        '''Seed the cache with data, e.g., from a previous run.'''
+        for key, value in data.iteritems():
+            if len(self.data) >= self.maxsize:
+                break
+
+            self.data.setdefault(key, value)
+
+    def merged(self, saved):
+        '''Return the entries of saved followed by the cache's, up to maxsize.
+
+        The cache's entries count as the more recently used, so the oldest of
+        saved's are the first to be dropped.
+        '''
+        merged = OrderedDict(saved)
+
+        for key, value in self.data.iteritems():
+            merged.pop(key, None)
+            merged[key] = value
+
+        while len(merged) > self.maxsize:
+            merged.popitem(last=False)
+
+        return merged
+
+    def info(self):
+        '''Return the cache's hits, misses, and size.'''
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class Syllabifier(finnsyll.FinnSyll):
+    '''FinnSyll, memoizing syllabify(), split(), and annotate() by word.
+
+    Callers pass in lowercase orthographies, so case variants of the same
+    word share a single cache entry.
+    '''
+
+    def __init__(self, name='FinnSyll', maxsize=CACHE_SIZE, **kwargs):
+        finnsyll.FinnSyll.__init__(self, **kwargs)
+        self.name = name
+        self.caches = {
+            'syllabify': Cache(maxsize),
+            'split': Cache(maxsize),
+            'annotate': Cache(maxsize),
+            }
+
+    def syllabify(self, word):
+        '''Syllabify 'word'.'''
+        return self._cached('syllabify', word)
+
+    def split(self, word):
+        '''Split 'word' into any constituent words.'''
+        return self._cached('split', word)
+
+    def annotate(self, word):
+        '''Annotate 'word' for syllabification, stress, weights, and vowels.'''
+        return self._cached('annotate', word)
+
+    def _cached(self, method, word):
+        compute = getattr(finnsyll.FinnSyll, method).__get__(self)
+        value = self.caches[method].get(word, compute)
+
+        # hand out copies of cached lists, so that callers can't mutate them
+        return list(value) if isinstance(value, list) else value
+
+    def cache_info(self):
+        '''Return the hits, misses, and size of each of the caches.'''
+        return {method: c.info() for method, c in self.caches.iteritems()}
+
+    # persistence -------------------------------------------------------------
+
+    def cache_file(self, directory=CACHE_DIR):
+        '''Return the path of the cache file for this FinnSyll version.'''
+        filename = '%s-%s.pickle' % (self.name, finnsyll_version())
+
+        return path.join(directory, filename)
+
+    def load_cache(self, directory=CACHE_DIR):
+        '''Seed the caches with those saved by a previous run, if any.'''
+        data = read_cache(self.cache_file(directory))
+
+        for method, cache in self.caches.iteritems():
+            cache.update(data.get(method, {}))
+
+    def save_cache(self, directory=CACHE_DIR):
+        '''Merge the caches into those saved on disk, to be loaded later.
+
+        Several processes may save the same file (e.g., web workers, or the
+        workers of a Pool), so the file is locked while it is read, merged,
+        and replaced.
+        '''
+        if not path.isdir(directory):
+            os.makedirs(directory)
+
+        filename = self.cache_file(directory)
+
+        with open(filename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            saved = read_cache(filename)
+            data = {
+                method: c.merged(saved.get(method, {}))
+                for method, c in self.caches.iteritems()
+                }
+
+            # write to a temporary file of this process's own first, so that
+            # a crash mid-write can't leave behind a truncated cache
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+            os.chmod(tmp, 0644)
+            os.rename(tmp, filename)
+
+
+def read_cache(filename):
+    '''Return the caches saved to filename, or {} if there are none.'''
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def finnsyll_version():
+    '''Return a digest of the source files of the imported finnsyll package.
+
+    Any change to the syllabifier, released or not, yields a new version, so
+    caches saved by an older syllabifier are never reused.
+    '''
+    directory = path.dirname(path.abspath(finnsyll.__file__))
+    md5 = hashlib.md5()
+
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.py'):
+            with open(path.join(directory, filename), 'rb') as f:
+                md5.update(f.read())
+
+    return md5.hexdigest()[:12]
+
+
+def cache_info():
+    '''Return the cache statistics of each FinnSyll instance.'''
+    return {s.name: s.cache_info() for s in INSTANCES}
+
+
+# -----------------------------------------------------------------------------
+
+StressedFinnSyll = Syllabifier('StressedFinnSyll', rules=True, stress=True)
+_FinnSyll = Syllabifier('_FinnSyll', rules=False)
+FinnSyll = Syllabifier('FinnSyll', rules=True)
+
+INSTANCES = [StressedFinnSyll, _FinnSyll, FinnSyll]
 
-StressedFinnSyll = FinnSyll(rules=True, stress=True)
-_FinnSyll = FinnSyll(rules=False)
-FinnSyll = FinnSyll(rules=True)
+if CACHE_DIR:
+    for instance in INSTANCES:
+        instance.load_cache()
+        atexit.register(instance.save_cache)
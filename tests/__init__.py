@@ -0,0 +1,56 @@
+# coding=utf-8
+
+# Run with: python -m unittest discover tests
+#
+# The tests that touch the database need a scratch Postgres database, which
+# they empty and rebuild; point FINNSYLL_TEST_DATABASE at one, e.g.,
+#
+#   FINNSYLL_TEST_DATABASE=postgresql://localhost/finn_test
+
+import os
+import unittest
+
+import app as finn
+
+TEST_DATABASE = os.environ.get('FINNSYLL_TEST_DATABASE')
+
+
+@unittest.skipUnless(TEST_DATABASE, 'FINNSYLL_TEST_DATABASE is not set')
+class DatabaseTestCase(unittest.TestCase):
+    '''A test case run against an empty copy of the schema.'''
+
+    @classmethod
+    def setUpClass(cls):
+        finn.app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE
+        finn.app.config['TESTING'] = True
+
+        # a session opened before now would still be bound to the configured
+        # database
+        finn.db.session.remove()
+        assert str(finn.db.engine.url) == TEST_DATABASE
+
+        finn.db.drop_all()
+        finn.db.create_all()
+
+    def tearDown(self):
+        finn.db.session.remove()
+        tables = ', '.join(
+            '"%s"' % t.name for t in finn.db.metadata.sorted_tables)
+        with finn.db.engine.begin() as connection:
+            connection.execute('TRUNCATE %s RESTART IDENTITY CASCADE' % tables)
+
+    def add_tokens(self, *orths, **kwargs):
+        '''Add a Token for each orth, returning the Tokens.'''
+        tokens = [finn.Token(orth, **kwargs) for orth in orths]
+        finn.db.session.add_all(tokens)
+        finn.db.session.commit()
+
+        return tokens
+
+    def add_document(self, filename, tokenized_text):
+        '''Add a Document of Token IDs and strings, returning it.'''
+        doc = finn.Document(filename, tokenized_text)
+        finn.db.session.add(doc)
+        finn.db.session.commit()
+
+        return doc
@@ -0,0 +1,36 @@
+# coding=utf-8
+
+import app as finn
+import json
+import unittest
+
+
+class SyllabifyBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        finn.app.config['TESTING'] = True
+        self.client = finn.app.test_client()
+
+        with self.client.session_transaction() as session:
+            session['current_user'] = 1
+            session['is_admin'] = True
+
+    def post(self, words, **kwargs):
+        return self.client.post(
+            '/syllabify/batch',
+            data=json.dumps(words),
+            content_type='application/json',
+            **kwargs
+            )
+
+    def test_words_are_stripped(self):
+        response = self.post([u'kala', u' kala ', u'KALA\n', u'  ', u'talo'])
+        data = json.loads(response.data)
+
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['unique'], 2)
+        self.assertEqual(
+            [r['word'] for r in data['results']], [u'kala', u'talo'])
+
+    def test_bad_request(self):
+        self.assertEqual(self.post({'words': [1, 2]}).status_code, 400)
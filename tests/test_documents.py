@@ -0,0 +1,120 @@
+# coding=utf-8
+
+import app as finn
+
+from tests import DatabaseTestCase
+
+
+class QueryDocumentTest(DatabaseTestCase):
+
+    def test_repeated_tokens(self):
+        kala, auto, talo = self.add_tokens(u'kala', u'auto', u'talo')
+        doc = self.add_document('doc.xml', [
+            kala.id, u',', auto.id, talo.id, kala.id, u',', kala.id])
+
+        text = doc.query_document()
+
+        self.assertEqual(
+            [t if isinstance(t, unicode) else t.id for t in text],
+            [kala.id, u',', auto.id, talo.id, kala.id, u',', kala.id],
+            )
+        self.assertIsInstance(text[4], finn.Token)
+
+
+class DocViewTest(DatabaseTestCase):
+
+    def setUp(self):
+        self.client = finn.app.test_client()
+
+        with self.client.session_transaction() as session:
+            session['current_user'] = 1
+            session['is_admin'] = True
+
+    def test_caches_rendering(self):
+        kala, auto = self.add_tokens(u'kala', u'auto')
+        doc = self.add_document('doc.xml', [kala.id, u',', auto.id, kala.id])
+
+        response = self.client.get('/doc/%s' % doc.id)
+        self.assertEqual(response.status_code, 200)
+
+        finn.db.session.expire_all()
+        rendered = finn.Document.query.get(doc.id).rendered
+        self.assertIsNotNone(rendered)
+        self.assertIn(rendered, response.data.decode('utf-8'))
+
+        # the cached rendering is served as is
+        again = self.client.get('/doc/%s' % doc.id)
+        self.assertEqual(again.data, response.data)
+
+    def test_caching_leaves_session_uncommitted(self):
+        kala, = self.add_tokens(u'kala')
+        doc = self.add_document('doc.xml', [kala.id])
+
+        kala.note = u'unsaved'
+        finn.cache_rendered(doc.id, 0, u'<div>kala</div>')
+        finn.db.session.rollback()
+
+        finn.db.session.expire_all()
+        self.assertEqual(finn.Token.query.get(kala.id).note, u'')
+        self.assertEqual(
+            finn.Document.query.get(doc.id).rendered, u'<div>kala</div>')
+
+    def test_correction_while_rendering(self):
+        kala, = self.add_tokens(u'kala')
+        doc = self.add_document('doc.xml', [kala.id])
+
+        # a view reads the Document and renders its Tokens, then a correction
+        # is committed before the view caches its rendering
+        version = doc.rendered_version
+        kala.note = u'corrected'
+        finn.invalidate_documents([kala.id])
+        finn.db.session.commit()
+
+        finn.cache_rendered(doc.id, version, u'<div>kala</div>')
+
+        finn.db.session.expire_all()
+        self.assertIsNone(finn.Document.query.get(doc.id).rendered)
+
+        # the next rendering is cached
+        response = self.client.get('/doc/%s' % doc.id)
+        self.assertIn(u'corrected', response.data.decode('utf-8'))
+
+        finn.db.session.expire_all()
+        self.assertIn(u'corrected', finn.Document.query.get(doc.id).rendered)
+
+
+class ApproveDocumentTest(DatabaseTestCase):
+
+    def test_approval_adjusts_performance(self):
+        verified, simplex, compound, loanword, empty, other = self.add_tokens(
+            u'kala', u'auto', u'talo', u'kahvi', u'puu', u'kuu')
+        verified.correct(syll=[u'ka.la'])
+        compound.is_complex = True
+        loanword.is_loanword = True
+        empty.test_syll = []
+        finn.db.session.add_all([
+            finn.Performance(with_loanwords=True),
+            finn.Performance(with_loanwords=False),
+            ])
+        finn.db.session.commit()
+        finn.update_performance()
+
+        doc = self.add_document('doc.xml', [
+            verified.id, simplex.id, compound.id, loanword.id, empty.id,
+            simplex.id])
+        doc.verify_all_unverified_tokens()
+
+        stats = lambda: sorted(
+            [getattr(P, attr) for attr in ['with_loanwords', 'p', 'r', 'f1']
+             + finn.Performance.TALLIED]
+            for P in finn.Performance.query.all())
+        adjusted = stats()
+
+        finn.update_performance()
+        self.assertEqual(adjusted, stats())
+
+        # the loanword is only counted with loanwords
+        self.assertEqual([row[4] for row in adjusted], [4, 5])
+
+        # the other document's token is untouched
+        self.assertIsNone(finn.Token.query.get(other.id).is_gold)
@@ -0,0 +1,61 @@
+# coding=utf-8
+
+import shutil
+import tempfile
+import unittest
+
+import instrument
+
+from flask import Flask
+from flask.ext.sqlalchemy import SQLAlchemy
+
+
+class InstrumentTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['INSTRUMENT_LOG'] = cls.directory + '/requests.log'
+        app.config['INSTRUMENT_PROFILE'] = True
+        app.config['INSTRUMENT_PROFILE_DIR'] = cls.directory
+        db = SQLAlchemy(app)
+
+        @app.route('/select')
+        def select_view():
+            return str(db.session.execute('SELECT 1').scalar())
+
+        @app.route('/fail')
+        def fail_view():
+            db.session.execute('SELECT * FROM missing')
+
+        instrument.init_app(app, db)
+        cls.client = app.test_client()
+        cls.db = db
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_records_request(self):
+        self.assertEqual(self.client.get('/select').status_code, 200)
+
+        record = instrument.RECENT[-1]
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['sql_count'], 1)
+
+    def test_records_failed_request(self):
+        self.assertEqual(self.client.get('/fail').status_code, 500)
+
+        record = instrument.RECENT[-1]
+        self.assertEqual(record['status'], 500)
+        self.assertEqual(record['endpoint'], 'fail_view')
+        self.assertEqual(record['sql_count'], 1)
+        self.assertIn('OperationalError', record['error'])
+        self.assertEqual(instrument.ACTIVE, {})
+
+        # the failed statement's start time is not left behind
+        with self.db.engine.connect() as connection:
+            self.assertEqual(connection.info['instrument_started'], [])
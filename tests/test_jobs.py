@@ -0,0 +1,99 @@
+# coding=utf-8
+
+import app as finn
+
+from datetime import datetime, timedelta
+from time import sleep
+from tests import DatabaseTestCase
+
+RESULTS = []
+
+
+@finn.job
+def record(value):
+    RESULTS.append(value)
+
+    return value
+
+
+@finn.job
+def wait(seconds):
+    sleep(seconds)
+
+    # (the Job's row is read on a connection of its own, as a web worker
+    # polling it would)
+    with finn.db.engine.begin() as connection:
+        return connection.execute(
+            'SELECT updated > started FROM "Job" WHERE kind = \'wait\''
+            ).scalar()
+
+
+class JobQueueTest(DatabaseTestCase):
+
+    def setUp(self):
+        del RESULTS[:]
+
+    def test_enqueue_deduplicates(self):
+        j = finn.enqueue('record', 1)
+
+        self.assertEqual(finn.enqueue('record', 1).id, j.id)
+        self.assertNotEqual(finn.enqueue('record', 2).id, j.id)
+
+        # a running Job is still pending
+        self.assertEqual(finn.claim_job().id, j.id)
+        self.assertEqual(finn.enqueue('record', 1).id, j.id)
+
+    def test_abandoned_job_can_be_requeued(self):
+        j = finn.enqueue('record', 1)
+        self.assertEqual(finn.claim_job().id, j.id)
+
+        # the worker dies mid-job, leaving it running without a heartbeat
+        timeout = timedelta(seconds=finn.JOB_TIMEOUT + 60)
+        finn.Job.query.get(j.id).updated = datetime.utcnow() - timeout
+        finn.db.session.commit()
+
+        again = finn.enqueue('record', 1)
+        self.assertNotEqual(again.id, j.id)
+
+        # the next claim fails the abandoned Job and runs the new one
+        claimed = finn.claim_job()
+        self.assertEqual(claimed.id, again.id)
+        self.assertEqual(finn.Job.query.get(j.id).status, u'failed')
+
+        finn.run_job(claimed)
+        self.assertEqual(RESULTS, [1])
+        self.assertEqual(finn.Job.query.get(again.id).status, u'complete')
+
+    def test_long_job_is_not_abandoned(self):
+        heartbeat = finn.JOB_HEARTBEAT
+        finn.JOB_HEARTBEAT = 0.1
+
+        try:
+            j = finn.enqueue('wait', 0.5)
+            finn.run_job(finn.claim_job())
+
+        finally:
+            finn.JOB_HEARTBEAT = heartbeat
+
+        j = finn.Job.query.get(j.id)
+        self.assertEqual((j.status, j.result), (u'complete', u'True'))
+
+    def test_failed_job_is_not_completed(self):
+        j = finn.enqueue('record', 1)
+        claimed = finn.claim_job()
+
+        # the Job is presumed abandoned while its worker is still running it
+        finn.Job.query.get(j.id).status = u'failed'
+        finn.db.session.commit()
+
+        finn.run_job(claimed)
+        self.assertEqual(RESULTS, [1])
+        self.assertEqual(finn.Job.query.get(j.id).status, u'failed')
+
+    def test_run_jobs_once(self):
+        finn.enqueue('record', 1)
+        finn.enqueue('record', 2)
+        finn.run_jobs(once=True)
+
+        self.assertEqual(RESULTS, [1, 2])
+        self.assertIsNone(finn.pending_job('record', 1))
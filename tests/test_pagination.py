@@ -0,0 +1,90 @@
+# coding=utf-8
+
+import app as finn
+
+from itertools import product
+from tests import DatabaseTestCase
+
+
+class BadListingTest(DatabaseTestCase):
+
+    def setUp(self):
+        # every combination of a good, bad, or unknown split and a null,
+        # empty, or given note, twice over (to exercise the id tie-breaker)
+        splits = [u'same', u'other', None]
+        notes = [None, u'', u'a', u'b']
+        orths = (u'kala', u'talo')
+
+        for orth, split, note in product(orths, splits, notes):
+            t = finn.Token(orth)
+            t.gold_base = t.test_base if split == u'same' else split
+            t.note = note
+            t.is_gold = False
+            finn.db.session.add(t)
+            finn.db.session.flush()
+
+            # (the ORM would insert the columns' defaults instead of nulls)
+            finn.Token.query.filter_by(id=t.id).update(
+                {'gold_base': t.gold_base, 'note': note},
+                synchronize_session=False,
+                )
+
+        finn.db.session.commit()
+
+    def paginate_all(self, per_page):
+        tokens, page = [], 1
+
+        while True:
+            rows, pagination = finn.paginate(page, 'bad', per_page=per_page)
+            tokens.extend(rows)
+
+            if not pagination.has_next:
+                return tokens, pagination.total_count
+
+            page += 1
+
+    def test_order_matches_original(self):
+        # the listing's original order (with ties broken by id)
+        expected = finn.get_bad_tokens().order_by(
+            finn.Token.is_bad_split,
+            finn.Token.note.desc(),
+            finn.Token.id.desc(),
+            ).all()
+
+        tokens, count = self.paginate_all(per_page=5)
+
+        self.assertEqual(count, len(expected))
+        self.assertEqual([t.id for t in tokens], [t.id for t in expected])
+        self.assertIsNone(tokens[0].note)
+
+    def test_order_from_stored_bookmarks(self):
+        finn.refresh_listing('bad', 5)
+        self.test_order_matches_original()
+
+    def test_bookmarks_refreshed_by_job(self):
+        # the first request scans the listing itself, queueing a Job to store
+        # its bookmarks
+        tokens, count = self.paginate_all(per_page=5)
+        self.assertEqual(count, 24)
+
+        jobs = finn.Job.query.filter_by(kind='refresh_listing').all()
+        self.assertEqual([j.args for j in jobs], [['bad', 5]])
+
+        finn.run_jobs(once=True)
+        listing = finn.Listing.query.get(('bad', 5))
+        self.assertEqual(listing.count, 24)
+        self.assertEqual(len(listing.bookmarks), 4)
+
+        # later requests are served from the stored bookmarks, even once the
+        # listing has changed
+        self.add_tokens(u'kuu', is_gold=False)
+        self.assertEqual(self.paginate_all(per_page=5)[1], 24)
+        self.assertEqual(finn.pending_job('refresh_listing', 'bad', 5), None)
+
+        # until they are stale
+        listing.refreshed -= finn.timedelta(seconds=finn.BOOKMARK_TTL)
+        finn.db.session.commit()
+        self.assertEqual(self.paginate_all(per_page=5)[1], 24)
+
+        finn.run_jobs(once=True)
+        self.assertEqual(self.paginate_all(per_page=5)[1], 25)
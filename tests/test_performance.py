@@ -0,0 +1,65 @@
+# coding=utf-8
+
+import app as finn
+
+from tests import DatabaseTestCase
+
+
+class AdjustPerformancesTest(DatabaseTestCase):
+
+    def setUp(self):
+        finn.db.session.add_all([
+            finn.Performance(with_loanwords=True),
+            finn.Performance(with_loanwords=False),
+            ])
+        finn.db.session.commit()
+
+    def stats(self):
+        finn.db.session.expire_all()
+
+        return sorted(
+            [getattr(P, attr) for attr in ['with_loanwords', 'p', 'r', 'f1']
+             + finn.Performance.TALLIED]
+            for P in finn.Performance.query.all())
+
+    def correct(self, token, **kwargs):
+        before = token.tally()
+        token.correct(**kwargs)
+        finn.adjust_performance(token, before)
+
+    def test_matches_update_performance(self):
+        kala, auto, kahvi = self.add_tokens(u'kala', u'auto', u'kahvi')
+        kahvi.is_loanword = True
+        finn.db.session.commit()
+
+        self.correct(kala, syll=[u'ka.la'])
+        self.correct(auto, syll=[u'au.to'])
+        self.correct(kahvi, syll=[u'kah.vi'])
+        self.correct(auto, syll=[u'a.u.to'])
+        finn.db.session.commit()
+
+        adjusted = self.stats()
+        finn.update_performance()
+        self.assertEqual(adjusted, self.stats())
+
+    def test_concurrent_corrections(self):
+        kala, auto = self.add_tokens(u'kala', u'auto')
+
+        # this session reads the statistics (keeping them in its identity
+        # map), then another annotator's correction is committed before this
+        # session saves its own
+        performances = finn.Performance.query.all()  # noqa
+
+        with finn.db.engine.begin() as connection:
+            connection.execute(
+                finn.Token.__table__.update()
+                .where(finn.Token.id == auto.id)
+                .values(is_gold=False))
+            connection.execute(
+                'UPDATE "Performance" SET verified = coalesce(verified, 0) + 1, '
+                'simp_verified = coalesce(simp_verified, 0) + 1')
+
+        self.correct(kala, syll=[u'ka.la'])
+        finn.db.session.commit()
+
+        self.assertEqual([row[4] for row in self.stats()], [2, 2])
@@ -0,0 +1,48 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+
+import app as finn
+import eval
+import snapshot
+
+from tests import DatabaseTestCase
+
+
+class SnapshotTest(DatabaseTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(SnapshotTest, self).tearDown()
+
+    def test_gold_matches_database(self):
+        # tokens added out of the gold set's order, with ties on its keys
+        orths = [u'kala', u'auto', u'talo', u'kahvi', u'puu', u'kuu']
+        tokens = self.add_tokens(*orths)
+
+        for t, freq in zip(tokens, [1, 5, 5, 3, 1, 5]):
+            t.correct(syll=[t.test_syll1])
+            t.freq = freq
+
+        tokens[1].is_complex = True
+        tokens[2].correct(syll=[u'ta.lo.x'])
+        tokens[5].correct(syll=[u'k.uu'])
+        finn.db.session.commit()
+
+        # (get_gold_tokens()'s default query is bound to the session of the
+        # configured database)
+        gold = finn.get_gold_tokens(finn.Token.query)
+        filename = os.path.join(self.directory, 'gold.snapshot')
+        self.assertEqual(snapshot.export(filename, gold), len(orths))
+
+        expected = eval.gold_snapshot(gold)
+        self.assertEqual(snapshot.load(filename).gold(), expected)
+        self.assertNotEqual(
+            [g.orth for g in expected],
+            [t.orth for t in sorted(tokens, key=lambda t: t.id)],
+            )
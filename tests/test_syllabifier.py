@@ -0,0 +1,92 @@
+# coding=utf-8
+
+import app as finn
+import os
+import shutil
+import tempfile
+import unittest
+
+from multiprocessing import Pool
+from syllabifier import Cache, read_cache, Syllabifier
+from tests import DatabaseTestCase
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_merged(self):
+        cache = Cache(maxsize=3)
+        cache.put('b', 2)
+        cache.put('c', 3)
+
+        merged = cache.merged({'a': 1, 'b': 0})
+        self.assertEqual(merged.items(), [('a', 1), ('b', 2), ('c', 3)])
+
+        # the oldest saved entries are dropped first
+        cache.put('d', 4)
+        merged = cache.merged({'a': 1, 'e': 5})
+        self.assertEqual(merged.keys(), ['b', 'c', 'd'])
+
+
+class SaveCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = finn.CACHE_DIR
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        finn.CACHE_DIR = self.cache_dir
+
+    def saved(self, method='syllabify'):
+        filename = Syllabifier(rules=True).cache_file(self.directory)
+
+        return read_cache(filename).get(method, {})
+
+    def test_saves_merge(self):
+        # e.g., two web workers, each with its own cache
+        first, second = Syllabifier(rules=True), Syllabifier(rules=True)
+        first.syllabify(u'kala')
+        second.syllabify(u'talo')
+
+        first.save_cache(self.directory)
+        second.save_cache(self.directory)
+
+        self.assertEqual(sorted(self.saved()), [u'kala', u'talo'])
+        self.assertEqual(
+            [f for f in os.listdir(self.directory) if f.endswith('.tmp')],
+            [],
+            )
+
+    def test_pool_workers_save(self):
+        finn.CACHE_DIR = self.directory
+        words = [u'kala', u'talo', u'auto', u'laulu']
+
+        pool = Pool(2, initializer=finn.init_worker)
+        pool.map(finn.syllabify_values, words, chunksize=1)
+        pool.close()
+        pool.join()
+
+        self.assertEqual(sorted(self.saved()), sorted(words))
+
+
+class SyllabifyTokensCacheTest(DatabaseTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = finn.CACHE_DIR
+
+    def tearDown(self):
+        DatabaseTestCase.tearDown(self)
+        shutil.rmtree(self.directory)
+        finn.CACHE_DIR = self.cache_dir
+
+    def test_workers_save(self):
+        orths = [u'kala', u'talo', u'auto', u'laulu']
+        self.add_tokens(*orths)
+
+        finn.CACHE_DIR = self.directory
+        finn.syllabify_tokens(workers=2)
+
+        filename = Syllabifier(rules=True).cache_file(self.directory)
+        saved = read_cache(filename).get('syllabify', {})
+        self.assertEqual(sorted(saved), sorted(orths))